@@ -2,17 +2,23 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import io
-import urllib.request
-from fpdf import FPDF
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+import einvoice
+from invoice_pdf import generate_pdf
+import invoice_core
+from invoice_core import get_next_alpha_numeric, compute_line_item, is_intra_state
+from google_scheduler import (
+    GoogleScheduler, GoogleQuotaError, PRIORITY_SAVE, PRIORITY_READ, PRIORITY_BACKGROUND
+)
+from snapshot_cache import SnapshotCache, IncompleteSnapshot
+import reconciliation
+import profiling
 
 # Helper to load creds from Streamlit Secrets
 def get_gcp_creds():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    scope = invoice_core.GOOGLE_SCOPE
     
     # Try local file first (for local dev)
     try:
@@ -33,111 +39,177 @@ def get_gcp_creds():
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Invoice Generator", page_icon="🧾", layout="wide")
 
+# --- PROFILING ---
+# Opt-in with INVOICE_PROFILE=1 or ?profile=1. When off nothing is sampled
+# and the start/finish helpers return immediately.
+PROFILING = profiling.profiling_enabled(st.query_params)
+
+@st.cache_resource
+def get_profile_ring():
+    return profiling.ProfileRing()
+
+def start_profile(label):
+    if not PROFILING:
+        return None
+    return profiling.StackSampler(label, root_file=__file__).start()
+
+def finish_profile(sampler):
+    if sampler is not None:
+        get_profile_ring().save(sampler.stop())
+
+def finish_rerun_profile():
+    finish_profile(st.session_state.pop("rerun_profiler", None))
+
+# A rerun cut short by an exception never reached its finish call
+finish_rerun_profile()
+if PROFILING:
+    st.session_state.rerun_profiler = start_profile("rerun")
+
+# --- GOOGLE API SCHEDULER ---
+# One scheduler shared by all sessions so rate limits and backoff are global
+@st.cache_resource
+def get_google_scheduler():
+    return GoogleScheduler()
+
+google = get_google_scheduler()
+
+def open_spreadsheet(creds, priority=PRIORITY_READ):
+    return invoice_core.open_spreadsheet(google, creds, priority)
+
+def read_worksheet(spreadsheet, name, method, priority=PRIORITY_READ):
+    return invoice_core.read_worksheet(google, spreadsheet, name, method, priority)
+
 
 # --- APP START ---
-logo_url = "https://lilcoo.in/wp-content/uploads/2026/02/LilCoo-Logo.png"
+logo_url = invoice_core.LOGO_URL
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def get_pdf_logo_bytes():
+    # Download once per day instead of once per rerun. Errors are not cached,
+    # so a failed download is retried on the next render.
+    return invoice_core.fetch_pdf_logo()
+
 # --- MOCK DATA ---
 # This is now fetched from Google Sheets below.
 
 # --- PRELOAD GOOGLE SHEETS DATA ---
-@st.cache_data(ttl=600)
-def get_google_sheets_data():
-    data = {
+CATALOG_TTL = 600
+
+def empty_catalog():
+    return {
         'billed_by': {},
         'clients': {},
         'products': {
             "Select Product": {"hsn": "", "price": 0, "gst": 18, "name": "Select Product"}
         }
     }
+
+def load_google_sheets_data(previous=None):
+    # Refreshing an already served catalog is background work. A worksheet that
+    # fails to load keeps its previous section instead of going empty, and the
+    # catalog is marked incomplete so it is retried soon rather than after
+    # CATALOG_TTL.
+    priority = PRIORITY_READ if previous is None else PRIORITY_BACKGROUND
+    data = dict(previous) if previous is not None else empty_catalog()
+    failed = []
+    creds = get_gcp_creds()
+    spreadsheet = open_spreadsheet(creds, priority=priority)
+
+    # Billed By
     try:
-        creds = get_gcp_creds()
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key('1msnl_ZYZTvl1j45mjPI9FvzXDphJNLsOPfhyNxanK5I')
+        billed_by_records = read_worksheet(spreadsheet, 'Billed By', 'get_all_records', priority)
+        if billed_by_records:
+            data['billed_by'] = billed_by_records[0]
+    except Exception as e:
+        print(f"Error fetching Billed By: {e}")
+        failed.append('Billed By')
         
-        # Billed By
-        try:
-            billed_by_records = spreadsheet.worksheet('Billed By').get_all_records()
-            if billed_by_records:
-                data['billed_by'] = billed_by_records[0]
-        except Exception as e:
-            print(f"Error fetching Billed By: {e}")
-            
-        # Clients
-        try:
-            clients_records = spreadsheet.worksheet('Clients').get_all_records()
-            if clients_records:
-                data['clients'] = {}
-                for row in clients_records:
-                    if row.get('Client Name'):
-                        key = f"{row.get('Client Name')} - {row.get('State', 'Unknown')}"
-                        data['clients'][key] = {
-                            "name": row.get('Client Name', ''),
-                            "address": row.get('Address', ''),
-                            "state": row.get('State', ''),
-                            "gstin": str(row.get('GSTIN', '')),
-                            "pan": str(row.get('PAN', '')),
-                            "phone": str(row.get('Phone', ''))
-                        }
-        except Exception as e:
-            print(f"Error fetching Clients: {e}")
-            
-        # Products
-        try:
-            products_sheet = spreadsheet.worksheet('Products')
-            all_values = products_sheet.get_all_values()
-            
-            if len(all_values) > 1:
-                headers = all_values[0]
-                products_records = [dict(zip(headers, row)) for row in all_values[1:]]
-            else:
-                products_records = []
-
-            if products_records:
-                data['products'] = {"Select Product": {"hsn": "", "price": 0, "mrp": 0, "gst": 18, "name": "Select Product"}}
-                for row in products_records:
-                    if row.get('Product Name') and str(row.get('Product Name')).strip():
-                        # Extract price carefully
-                        try:
-                            price_raw = str(row.get('Price', 0))
-                            if not price_raw.strip(): price_raw = "0"
-                            price_val = float(price_raw.replace(',', ''))
-                        except Exception:
-                            price_val = 0.0
-                            
-                        # Extract MRP carefully, defaulting to price if missing
-                        try:
-                            mrp_raw = str(row.get('MRP', ''))
-                            if mrp_raw.strip():
-                                mrp_val = float(mrp_raw.replace(',', ''))
-                            else:
-                                mrp_val = price_val
-                        except Exception:
+    # Clients
+    try:
+        clients_records = read_worksheet(spreadsheet, 'Clients', 'get_all_records', priority)
+        if clients_records:
+            data['clients'] = {}
+            for row in clients_records:
+                if row.get('Client Name'):
+                    key = f"{row.get('Client Name')} - {row.get('State', 'Unknown')}"
+                    data['clients'][key] = {
+                        "name": row.get('Client Name', ''),
+                        "address": row.get('Address', ''),
+                        "state": row.get('State', ''),
+                        "gstin": str(row.get('GSTIN', '')),
+                        "pan": str(row.get('PAN', '')),
+                        "phone": str(row.get('Phone', ''))
+                    }
+    except Exception as e:
+        print(f"Error fetching Clients: {e}")
+        failed.append('Clients')
+        
+    # Products
+    try:
+        all_values = read_worksheet(spreadsheet, 'Products', 'get_all_values', priority)
+        
+        if len(all_values) > 1:
+            headers = all_values[0]
+            products_records = [dict(zip(headers, row)) for row in all_values[1:]]
+        else:
+            products_records = []
+
+        if products_records:
+            data['products'] = {"Select Product": {"hsn": "", "price": 0, "mrp": 0, "gst": 18, "name": "Select Product"}}
+            for row in products_records:
+                if row.get('Product Name') and str(row.get('Product Name')).strip():
+                    # Extract price carefully
+                    try:
+                        price_raw = str(row.get('Price', 0))
+                        if not price_raw.strip(): price_raw = "0"
+                        price_val = float(price_raw.replace(',', ''))
+                    except Exception:
+                        price_val = 0.0
+                        
+                    # Extract MRP carefully, defaulting to price if missing
+                    try:
+                        mrp_raw = str(row.get('MRP', ''))
+                        if mrp_raw.strip():
+                            mrp_val = float(mrp_raw.replace(',', ''))
+                        else:
                             mrp_val = price_val
-                            
-                        # Extract GST carefully
-                        try:
-                            gst_raw = str(row.get('GST %', 18))
-                            if not gst_raw.strip(): gst_raw = "18"
-                            gst_val = int(gst_raw.replace('%', ''))
-                        except Exception:
-                            gst_val = 18
-                            
-                        data['products'][row.get('Product Name')] = {
-                            "name": row.get('Product Name', ''),
-                            "hsn": str(row.get('HSN Code', '')),
-                            "price": price_val,
-                            "mrp": mrp_val,
-                            "gst": gst_val
-                        }
-        except Exception as e:
-            print(f"Error fetching Products: {e}")
-            
+                    except Exception:
+                        mrp_val = price_val
+                        
+                    # Extract GST carefully
+                    try:
+                        gst_raw = str(row.get('GST %', 18))
+                        if not gst_raw.strip(): gst_raw = "18"
+                        gst_val = int(gst_raw.replace('%', ''))
+                    except Exception:
+                        gst_val = 18
+                        
+                    data['products'][row.get('Product Name')] = {
+                        "name": row.get('Product Name', ''),
+                        "hsn": str(row.get('HSN Code', '')),
+                        "price": price_val,
+                        "mrp": mrp_val,
+                        "gst": gst_val
+                    }
     except Exception as e:
-        print(f"Error loading data from Google Sheets: {e}")
-        st.error(f"⚠️ Could not load data from Google Sheets. Check your Secrets/Credentials.")
+        print(f"Error fetching Products: {e}")
+        failed.append('Products')
+
+    if failed:
+        raise IncompleteSnapshot(data, f"could not read {', '.join(failed)}")
     return data
 
-gs_data = get_google_sheets_data()
+@st.cache_resource
+def get_catalog_cache():
+    # Shared by all sessions: serves the last good snapshot and refreshes it
+    # in a single background thread once it is older than CATALOG_TTL
+    return SnapshotCache(load_google_sheets_data, ttl=CATALOG_TTL)
+
+catalog = get_catalog_cache()
+gs_data = catalog.get()
+if gs_data is None:
+    st.error(f"⚠️ Could not load data from Google Sheets. Check your Secrets/Credentials.")
+    gs_data = empty_catalog()
 billed_by = gs_data['billed_by']
 MOCK_CLIENTS = gs_data['clients']
 MOCK_PRODUCTS = gs_data['products']
@@ -176,9 +248,7 @@ def on_disc_change(idx):
     current_gst = st.session_state.get(f"gst_{idx}", 18)
     disc = st.session_state.get(f"ind_discount_{idx}", 0.0)
     if original > 0:
-        disc_sheet_price = original * ((100.0 - disc) / 100.0)
-        new_rate = disc_sheet_price / (1.0 + (current_gst / 100.0))
-        st.session_state[f"price_{idx}"] = round(new_rate, 2)
+        st.session_state[f"price_{idx}"] = invoice_core.discounted_rate(original, disc, current_gst)
 
 def on_price_change(idx):
     # When price changes, recalculate discount
@@ -212,6 +282,118 @@ STATES = [
     "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry", "Other"
 ]
 
+# --- GOOGLE API STATS ---
+with st.sidebar.expander("Google API stats"):
+    for api_name, api_stats in google.stats().items():
+        st.markdown(f"**{api_name.title()}**")
+        st.json(api_stats, expanded=False)
+    catalog_age = catalog.age()
+    if catalog_age is not None:
+        refreshing = " (refreshing)" if catalog.refreshing else ""
+        st.caption(f"Catalog snapshot: {int(catalog_age)}s old{refreshing}")
+
+# --- PROFILING REPORT ---
+if PROFILING:
+    with st.sidebar.expander("Profiling"):
+        profile_ring = get_profile_ring()
+        saved_profiles = profile_ring.list()
+        if not saved_profiles:
+            st.caption("No profiles yet. Each rerun and save is recorded once it finishes.")
+        else:
+            profile_name = st.selectbox(
+                "Profile", saved_profiles, key="profile_select_input", format_func=profiling.profile_title
+            )
+            try:
+                profile = profile_ring.load(profile_name)
+            except (OSError, ValueError):
+                # Pruned by another session since the list was read
+                profile = None
+            if profile:
+                capped = " (stopped at the time limit)" if profile.get("truncated") else ""
+                st.caption(f"{profile['wall_s'] * 1000:.0f} ms, {profile['samples']} samples{capped}")
+                st.dataframe(pd.DataFrame(profiling.hot_functions(profile)), hide_index=True)
+                st.download_button(
+                    "⬇️ Flamegraph stacks",
+                    data=profiling.folded(profile),
+                    file_name=profile_name.replace(".json", ".folded"),
+                    mime="text/plain",
+                    key="profile_download"
+                )
+
+# --- PAYMENT RECONCILIATION ---
+app_mode = st.sidebar.radio("Mode", ["Create Invoice", "Reconcile Payments"], key="app_mode_input")
+
+if app_mode == "Reconcile Payments":
+    st.title("Payment Reconciliation")
+    statements = st.file_uploader(
+        "Bank statement CSVs", type=["csv"], accept_multiple_files=True, key="bank_statements_input"
+    )
+    tolerance = st.number_input("Amount tolerance (₹)", min_value=0.0, value=1.0, step=0.5, key="recon_tolerance_input")
+
+    if statements and st.button("🔍 Reconcile Payments"):
+        try:
+            txns = []
+            for statement in statements:
+                txns.extend(reconciliation.parse_bank_statement(statement.getvalue(), statement.name))
+            spreadsheet = open_spreadsheet(get_gcp_creds())
+            invoice_values = read_worksheet(spreadsheet, 'Invoices', 'get_all_values')
+            invoices = reconciliation.invoices_from_sheet(invoice_values)
+            results, unmatched = reconciliation.reconcile(invoices, txns, amount_tolerance=tolerance)
+            st.session_state.reconciliation = {
+                "header": invoice_values[0] if invoice_values else [],
+                "invoices": invoices,
+                "results": results,
+                "unmatched": unmatched,
+                "txn_count": len(txns)
+            }
+        except ValueError as e:
+            st.error(f"Could not read bank statement: {str(e)}")
+        except GoogleQuotaError:
+            st.error("Google Sheets is rate-limiting requests right now. Please try again in a minute.")
+        except Exception as e:
+            st.error(f"Failed to reconcile payments: {str(e)}")
+
+    recon = st.session_state.get("reconciliation")
+    if recon:
+        results_df = pd.DataFrame([
+            {"Invoice No": inv_no, **res} for inv_no, res in recon["results"].items()
+        ])
+        status_counts = results_df["status"].value_counts() if not results_df.empty else {}
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Matched", int(status_counts.get(reconciliation.STATUS_MATCHED, 0)))
+        m2.metric("Partial", int(status_counts.get(reconciliation.STATUS_PARTIAL, 0)))
+        m3.metric("Unmatched invoices", int(status_counts.get(reconciliation.STATUS_UNMATCHED, 0)))
+        m4.metric("Unmatched credits", f"{len(recon['unmatched'])} / {recon['txn_count']}")
+
+        st.dataframe(results_df)
+        if recon["unmatched"]:
+            st.markdown("**Unmatched bank credits**")
+            st.dataframe(pd.DataFrame(recon["unmatched"]))
+
+        if st.button("💾 Write Results to Invoices Sheet"):
+            try:
+                first_col, rows = reconciliation.writeback_values(
+                    recon["header"], recon["invoices"], recon["results"]
+                )
+                last_col = first_col + len(reconciliation.RESULT_HEADERS) - 1
+                spreadsheet = open_spreadsheet(get_gcp_creds(), priority=PRIORITY_SAVE)
+                invoices_sheet = google.call("sheets", spreadsheet.worksheet, 'Invoices', priority=PRIORITY_SAVE)
+                if invoices_sheet.col_count < last_col:
+                    google.call(
+                        "sheets", invoices_sheet.add_cols, last_col - invoices_sheet.col_count,
+                        priority=PRIORITY_SAVE, idempotent=False
+                    )
+                # One batched write for the whole result block
+                cell_range = f"{gspread.utils.rowcol_to_a1(1, first_col)}:{gspread.utils.rowcol_to_a1(len(rows), last_col)}"
+                google.call("sheets", invoices_sheet.update, range_name=cell_range, values=rows, priority=PRIORITY_SAVE)
+                st.success(f"Payment status written to {len(rows) - 1} invoice rows.")
+            except GoogleQuotaError:
+                st.error("Google Sheets is rate-limiting requests right now. Please try again in a minute.")
+            except Exception as e:
+                st.error(f"Failed to write reconciliation results: {str(e)}")
+    finish_rerun_profile()
+    st.stop()
+
 # --- APP HEADER / BILLED BY ---
 head1, head2 = st.columns([1, 1])
 
@@ -227,37 +409,14 @@ def get_next_invoice_number(current_count):
         letter_idx = 25
     letter = chr(65 + letter_idx)
     return f"{letter}{num_part:05d}"
-    
-def get_next_alpha_numeric(current_val):
-    try:
-        letter = current_val[0]
-        num_part = int(current_val[1:])
-        num_part += 1
-        if num_part > 99999:
-            num_part = 0
-            if letter != 'Z':
-                letter = chr(ord(letter) + 1)
-        return f"{letter}{num_part:05d}"
-    except Exception:
-        return "A00001"
 
 def fetch_latest_invoice_number_from_sheet():
     try:
         creds = get_gcp_creds()
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key('1msnl_ZYZTvl1j45mjPI9FvzXDphJNLsOPfhyNxanK5I')
-        
-        invoices_sheet = spreadsheet.worksheet('Invoices')
-        records = invoices_sheet.get_all_records()
+        spreadsheet = open_spreadsheet(creds)
         
-        if not records:
-            return "A00001"
-            
-        last_invoice = records[-1].get('Invoice No', '')
-        if not last_invoice:
-            return "A00001"
-            
-        return get_next_alpha_numeric(last_invoice)
+        records = read_worksheet(spreadsheet, 'Invoices', 'get_all_records')
+        return invoice_core.next_invoice_number(records)
     except Exception as e:
         print(f"Error fetching latest invoice: {e}")
         return "A00001"
@@ -406,34 +565,11 @@ for i in range(st.session_state.item_rows):
             st.session_state[f"gst_{i}"] = 18
         gst_percent = st.number_input("GST %", min_value=0, step=1, key=f"gst_{i}")
         
-    row_total_base = base_price * quantity
-    
-    if from_state == "Karnataka" and to_state == "Karnataka":
-        cgst_amt = (row_total_base * (gst_percent / 2.0)) / 100.0
-        sgst_amt = (row_total_base * (gst_percent / 2.0)) / 100.0
-        igst_amt = 0
-    else:
-        cgst_amt = 0
-        sgst_amt = 0
-        igst_amt = (row_total_base * gst_percent) / 100.0
-        
-    row_total_final = row_total_base + cgst_amt + sgst_amt + igst_amt
-    
     if product_name.strip():
-        invoice_items.append({
-            "product": product_name,
-            "hsn": hsn_code,
-            "mrp": mrp_val,
-            "disc_percent": float(ind_discount),
-            "gst_percent": int(gst_percent),
-            "qty": quantity,
-            "price": base_price,
-            "base_total": row_total_base,
-            "cgst": cgst_amt,
-            "sgst": sgst_amt,
-            "igst": igst_amt,
-            "total": row_total_final
-        })
+        invoice_items.append(compute_line_item(
+            product_name, hsn_code, mrp_val, ind_discount, gst_percent, quantity, base_price,
+            is_intra_state(from_state, to_state)
+        ))
     st.write("---")
 
 col_btn1, col_btn2 = st.columns(2)
@@ -465,337 +601,73 @@ if invoice_items:
     col1_total, col2_total = st.columns([2, 1])
     with col2_total:
         st.write(f"**Subtotal:** ₹{subtotal:,.2f}")
-        if from_state == "Karnataka" and to_state == "Karnataka":
+        if is_intra_state(from_state, to_state):
             st.write(f"**CGST:** ₹{total_cgst:,.2f}")
             st.write(f"**SGST:** ₹{total_sgst:,.2f}")
         else:
             st.write(f"**IGST:** ₹{total_igst:,.2f}")
         st.markdown(f"### **Grand Total: ₹{grand_total:,.2f}**")
-        
     st.divider()
     
+    current_invoice = {
+        "invoice_number": invoice_number,
+        "invoice_date": invoice_date,
+        "due_date": due_date,
+        "billed_by": billed_by,
+        "from_state": from_state,
+        "client": {
+            "name": to_name, "address": to_address, "state": to_state,
+            "gstin": to_gstin, "pan": to_pan, "phone": to_phone
+        },
+        "items": invoice_items
+    }
+
     # PDF Generation Setup
     pdf_bytes = None
     try:
-        def generate_pdf():
-            # Helper to strip unsupported unicode characters before sending to fpdf2
-            def clean_text(t):
-                if t is None: return ""
-                t = str(t)
-                # Specific character replacements
-                t = t.replace('\u20b9', 'Rs.').replace('\u2018', "'").replace('\u2019', "'")
-                t = t.replace('\u201c', '"').replace('\u201d', '"').replace('\u2013', '-')
-                t = t.replace('\u2014', '-').replace('\u00a0', ' ').replace('\u200b', '')
-                
-                # Strip bidirectional/isolate formatting characters that Helvetica doesn't support
-                for char in ['\u2066', '\u2067', '\u2068', '\u2069', '\u200e', '\u200f', '\u202a', '\u202b', '\u202c', '\u202d', '\u202e']:
-                    t = t.replace(char, '')
-                    
-                return t.encode('latin-1', 'replace').decode('latin-1')
-
-            # We need a custom class to handle multi-page headers and footers properly
-            class InvoicePDF(FPDF):
-                def __init__(self, inv_no, inv_date, billed_to_name):
-                    super().__init__()
-                    self.inv_no = inv_no
-                    self.inv_date = inv_date
-                    self.billed_to_name = billed_to_name
-                    
-                def footer(self):
-                    # Go to 35 mm from bottom
-                    self.set_y(-35)
-                    
-                    # Separator Line First (The "Page Break" line)
-                    self.line(self.get_x(), self.get_y(), 210 - self.get_x(), self.get_y())
-                    self.ln(2)
-                    
-                    # --- Page Breaker Info ---
-                    # Left side: Invoice No and Date
-                    # Right side: Billed To
-                    self.set_font("helvetica", "B", 9)
-                    self.cell(40, 4, "Invoice No", border=0, new_x="RIGHT", new_y="TOP")
-                    self.cell(40, 4, "Invoice Date", border=0, new_x="RIGHT", new_y="TOP")
-                    self.cell(0, 4, "Billed To", border=0, new_x="LMARGIN", new_y="NEXT")
-                    
-                    self.set_font("helvetica", "", 9)
-                    self.cell(40, 4, clean_text(self.inv_no), border=0, new_x="RIGHT", new_y="TOP")
-                    self.cell(40, 4, self.inv_date.strftime('%d %b %Y'), border=0, new_x="RIGHT", new_y="TOP")
-                    self.cell(0, 4, clean_text(self.billed_to_name) if self.billed_to_name else "Client Name", border=0, new_x="LMARGIN", new_y="NEXT")
-                    
-                    self.ln(5)
-
-                    # --- Page Number & Disclaimer ---
-                    self.set_font("helvetica", "B", 9)
-                    self.cell(0, 6, f"Page {self.page_no()} of {{nb}}", align="L", new_x="LMARGIN", new_y="NEXT")
-                    
-                    self.set_font("helvetica", "", 8)
-                    self.set_text_color(128, 128, 128)
-                    self.cell(0, 4, "This is an electronically generated document, no signature is required.", align="L", new_x="LMARGIN", new_y="NEXT")
-                    self.set_text_color(0, 0, 0)
-
-            pdf = InvoicePDF(invoice_number, invoice_date, to_name)
-            pdf.alias_nb_pages() # Required for {nb} to be replaced with total pages
-            
-            # VERY IMPORTANT: Set the auto page break high enough so the table 
-            # stops drawing BEFORE it crashes into our custom 45mm tall footer.
-            pdf.set_auto_page_break(auto=True, margin=50) 
-            
-            pdf.add_page()
-            
-            # Logo on the Top Right
-            try:
-                req = urllib.request.Request(logo_url, headers={'User-Agent': 'Mozilla/5.0'})
-                with urllib.request.urlopen(req) as response:
-                    img_data = response.read()
-                    # Place logo on the top right. Page width is ~210mm.
-                    pdf.image(io.BytesIO(img_data), x=155, y=10, w=40)
-            except Exception:
-                pass 
-            
-            # Top Header - Left: Invoice Details
-            pdf.set_font("helvetica", "B", 24)
-            pdf.set_y(15)
-            pdf.cell(100, 10, "INVOICE", new_x="LMARGIN", new_y="NEXT", align="L")
-            pdf.ln(5)
-            
-            pdf.set_font("helvetica", "B", 10)
-            pdf.cell(35, 6, "Invoice Number:", new_x="RIGHT", new_y="TOP")
-            pdf.set_font("helvetica", "", 10)
-            pdf.cell(65, 6, clean_text(invoice_number), new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "B", 10)
-            pdf.cell(35, 6, "Invoice Date:", new_x="RIGHT", new_y="TOP")
-            pdf.set_font("helvetica", "", 10)
-            pdf.cell(65, 6, f"{invoice_date.strftime('%d %b %Y')}", new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "B", 10)
-            pdf.cell(35, 6, "Due Date:", new_x="RIGHT", new_y="TOP")
-            pdf.set_font("helvetica", "", 10)
-            pdf.cell(65, 6, f"{due_date.strftime('%d %b %Y')}", new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.ln(15)
-            
-            # Billed By (Left Side)
-            y_before_address = pdf.get_y()
-            pdf.set_font("helvetica", "B", 12)
-            pdf.cell(100, 6, "Billed By", new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "B", 10)
-            if billed_by.get('Company Name'):
-                pdf.cell(100, 5, clean_text(billed_by.get('Company Name', '')), new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "", 10)
-            if billed_by.get('Address Line 1'):
-                pdf.cell(100, 5, clean_text(billed_by.get('Address Line 1', '')), new_x="LMARGIN", new_y="NEXT")
-            if billed_by.get('Address Line 2'):
-                pdf.cell(100, 5, clean_text(billed_by.get('Address Line 2', '')), new_x="LMARGIN", new_y="NEXT")
-            if billed_by.get('GSTIN'):
-                pdf.cell(100, 5, clean_text(f"GSTIN: {billed_by.get('GSTIN', '')}"), new_x="LMARGIN", new_y="NEXT")
-            if billed_by.get('PAN'):
-                pdf.cell(100, 5, clean_text(f"PAN: {billed_by.get('PAN', '')}"), new_x="LMARGIN", new_y="NEXT")
-            if billed_by.get('Phone'):
-                pdf.cell(100, 5, clean_text(f"Phone: {billed_by.get('Phone', '')}"), new_x="LMARGIN", new_y="NEXT")
-            
-            # Billed To (Right Side)
-            # Move up and set right margin for 2-column layout
-            pdf.set_y(y_before_address)
-            pdf.set_left_margin(115)
-            
-            pdf.set_font("helvetica", "B", 12)
-            pdf.cell(0, 6, "Billed To", new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "B", 10)
-            if to_name:
-                pdf.cell(0, 5, clean_text(to_name), new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.set_font("helvetica", "", 10)
-            for line in to_address.split('\n'):
-                if line.strip():
-                    pdf.cell(0, 5, clean_text(line.strip()), new_x="LMARGIN", new_y="NEXT")
-            
-            pdf.cell(0, 5, clean_text(f"State: {to_state}"), new_x="LMARGIN", new_y="NEXT")
-            if to_gstin:
-                pdf.cell(0, 5, clean_text(f"GSTIN: {to_gstin}"), new_x="LMARGIN", new_y="NEXT")
-            if to_pan:
-                pdf.cell(0, 5, clean_text(f"PAN: {to_pan}"), new_x="LMARGIN", new_y="NEXT")
-            if to_phone and str(to_phone).strip() != "":
-                pdf.cell(0, 5, clean_text(f"Phone: {to_phone}"), new_x="LMARGIN", new_y="NEXT")
-            
-            # Reset Margin for Table
-            # Make Y coord lower than both columns
-            pdf.set_left_margin(10)
-            pdf.set_y(max(pdf.get_y(), y_before_address + 50) + 10)
-            
-            # Table Header Function
-            def draw_table_header():
-                pdf.set_font("helvetica", "B", 9)
-                pdf.set_fill_color(240, 240, 240)
-                
-                # Widths: S.No=7, Item=44, HSN=15, MRP=11, Disc=8, GST=9, Rate=14, Qty=9, BaseAmt=20, CGST=18, SGST=18, IGST=36, Total=25/7
-                # Total Width 190.
-                pdf.cell(7, 8, "", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
-                pdf.cell(44, 8, "Item", border=1, new_x="RIGHT", new_y="TOP", fill=True)
-                pdf.cell(15, 8, "HSN", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
-                pdf.cell(11, 8, "MRP", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                pdf.cell(9, 8, "GST%", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
-                pdf.cell(14, 8, "Rate", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                pdf.cell(9, 8, "Qty", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
-                pdf.cell(20, 8, "Amount", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                
-                if is_igst:
-                    pdf.cell(36, 8, "IGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                    pdf.cell(25, 8, "Total", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
-                else:
-                    pdf.cell(18, 8, "CGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                    pdf.cell(18, 8, "SGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                    pdf.cell(25, 8, "Total", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
-
-            is_igst = from_state != to_state
-            draw_table_header()
-            
-            # Table Rows
-            pdf.set_font("helvetica", "", 9)
-            for idx1, item1 in enumerate(invoice_items):
-                text_w = 44 # Item column width
-                text_lh = 4 # Less space between lines
-                min_row_h = 8
-                
-                # Use multi_cell with dry_run to calculate lines instead of deprecated split_only
-                lines = pdf.multi_cell(text_w, text_lh, str(item1['product']), border=0, align="L", dry_run=True, output="LINES")
-                required_h = len(lines) * text_lh
-                row_h = max(min_row_h, required_h)
-                
-                if pdf.will_page_break(row_h):
-                    pdf.add_page()
-                    draw_table_header()
-                    pdf.set_font("helvetica", "", 9)
-
-                # Draw cells
-                curr_x1 = pdf.get_x()
-                curr_y1 = pdf.get_y()
-                
-                # S.No
-                pdf.cell(7, row_h, str(idx1 + 1), border=1, new_x="RIGHT", new_y="TOP", align="C")
-                
-                # Item Name (Multi-line) centered vertically
-                y_offset = (row_h - required_h) / 2
-                pdf.set_xy(curr_x1 + 7, curr_y1 + y_offset)
-                pdf.multi_cell(text_w, text_lh, clean_text(item1['product']), border=0, align="L", new_x="RIGHT", new_y="TOP")
-                pdf.rect(curr_x1 + 7, curr_y1, text_w, row_h)
-                pdf.set_xy(curr_x1 + 7 + text_w, curr_y1)
-                
-                # Other columns
-                pdf.cell(15, row_h, clean_text(item1.get('hsn', '')), border=1, new_x="RIGHT", new_y="TOP", align="C")
-                pdf.cell(11, row_h, f"{int(item1.get('mrp', 0))}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                pdf.cell(9, row_h, f"{item1['gst_percent']}%", border=1, new_x="RIGHT", new_y="TOP", align="C")
-                pdf.cell(14, row_h, f"{item1['price']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                pdf.cell(9, row_h, str(item1['qty']), border=1, new_x="RIGHT", new_y="TOP", align="C")
-                pdf.cell(20, row_h, f"{item1['base_total']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                
-                if is_igst:
-                    pdf.cell(36, row_h, f"{item1['igst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                    pdf.cell(25, row_h, f"{item1['total']:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R")
-                else:
-                    pdf.cell(18, row_h, f"{item1['cgst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                    pdf.cell(18, row_h, f"{item1['sgst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
-                    pdf.cell(25, row_h, f"{item1['total']:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R")
-                    
-            # Total Row inside the table
-            if pdf.will_page_break(8):
-                pdf.add_page()
-                draw_table_header()
-
-            pdf.set_font("helvetica", "B", 9)
-            pdf.set_fill_color(240, 240, 240)
-            
-            total_qty_sum = df["qty"].sum()
-            pdf.cell(7 + 44 + 15 + 11 + 9 + 14, 8, "Total", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-            pdf.cell(9, 8, str(total_qty_sum), border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
-            pdf.cell(20, 8, f"{subtotal:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-            
-            if is_igst:
-                pdf.cell(36, 8, f"{total_igst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                pdf.cell(25, 8, f"{grand_total:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
-            else:
-                pdf.cell(18, 8, f"{total_cgst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                pdf.cell(18, 8, f"{total_sgst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
-                pdf.cell(25, 8, f"{grand_total:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
-                    
-            pdf.ln(5)
-            
-            # Totals Footer
-            pdf.set_left_margin(120)
-            pdf.set_font("helvetica", "", 10)
-            pdf.cell(30, 6, "Subtotal:", new_x="RIGHT", new_y="TOP", align="R")
-            pdf.cell(40, 6, f"Rs. {subtotal:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
-            
-            if not is_igst:
-                pdf.cell(30, 6, "CGST:", new_x="RIGHT", new_y="TOP", align="R")
-                pdf.cell(40, 6, f"Rs. {total_cgst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
-                pdf.cell(30, 6, "SGST:", new_x="RIGHT", new_y="TOP", align="R")
-                pdf.cell(40, 6, f"Rs. {total_sgst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
-            else:
-                pdf.cell(30, 6, "IGST:", new_x="RIGHT", new_y="TOP", align="R")
-                pdf.cell(40, 6, f"Rs. {total_igst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
-                
-            pdf.set_font("helvetica", "B", 12)
-            pdf.cell(30, 8, "Grand Total:", new_x="RIGHT", new_y="TOP", align="R")
-            pdf.cell(40, 8, f"Rs. {grand_total:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
-            
-            pdf.set_left_margin(10)
-            return bytes(pdf.output())
-
-        # Call the function
-        pdf_bytes = generate_pdf()
+        try:
+            logo_bytes = get_pdf_logo_bytes()
+        except Exception:
+            logo_bytes = None
+        pdf_bytes = generate_pdf(current_invoice, logo_bytes=logo_bytes)
+        st.caption(f"PDF size: {len(pdf_bytes) / 1024:,.1f} KB")
     except Exception as e:
         st.error(f"❌ PDF Generation Error: {str(e)}")
         st.info("Check your Streamlit Cloud logs or Ensure 'fpdf2' is in requirements.txt.")
 
-    action1, action2 = st.columns(2)
+    # GST e-invoice JSON for B2B invoices (client has a GSTIN)
+    einvoice_bytes = None
+    if to_gstin and str(to_gstin).strip():
+        try:
+            einvoice_bytes = einvoice.einvoice_json(current_invoice)
+        except einvoice.EInvoiceValidationError as e:
+            st.warning(f"e-Invoice JSON not available: {e.message}")
+
+    action1, action2, action3 = st.columns(3)
     
     with action1:
         # Instead of a button that triggers a download, we use a form to handle state
         # But Streamlit doesn't allow download_button inside a form execution natively easily
         # So we use a st.button that sets a flag in session state to show a success message
         if st.button("💾 Save & Download"):
+            save_profiler = start_profile("save")
             try:
                 creds = get_gcp_creds()
                 # 1. Upload to Google Drive First
                 drive_link = ""
                 try:
                     drive_service = build('drive', 'v3', credentials=creds)
-                    file_metadata = {
-                        'name': f"{invoice_number}.pdf",
-                        'parents': ['1lDGSAc6cyNP-nZuUZFRPmj0SDfdpLpy6']
-                    }
-                    media = MediaIoBaseUpload(io.BytesIO(pdf_bytes), mimetype='application/pdf')
-                    drive_file = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
-                    drive_link = drive_file.get('webViewLink', '')
+                    drive_link = invoice_core.upload_invoice_pdf(google, drive_service, invoice_number, pdf_bytes)
                 except Exception as drive_e:
                     st.warning(f"Failed to upload to Drive: {str(drive_e)}")
 
                 # 2. Save to Google Sheets
-                client = gspread.authorize(creds)
-                spreadsheet = client.open_by_key('1msnl_ZYZTvl1j45mjPI9FvzXDphJNLsOPfhyNxanK5I')
-                invoices_sheet = spreadsheet.worksheet('Invoices')
-                
-                # S.No, Invoice No, Date, Due Date, Client Name, Subtotal, CGST, SGST, IGST, Grand Total, Drive Link
-                s_no = len(invoices_sheet.get_all_values())  # Rows including header, so len is next S.no sequence
-                
-                row_data = [
-                    s_no,
-                    invoice_number,
-                    invoice_date.strftime('%Y-%m-%d'),
-                    due_date.strftime('%Y-%m-%d'),
-                    to_name,
-                    float(round(subtotal, 2)),
-                    float(round(total_cgst, 2)),
-                    float(round(total_sgst, 2)),
-                    float(round(total_igst, 2)),
-                    float(round(grand_total, 2)),
-                    drive_link
-                ]
-                invoices_sheet.append_row(row_data)
+                spreadsheet = open_spreadsheet(creds, priority=PRIORITY_SAVE)
+                invoice_core.append_invoice_row(google, spreadsheet, current_invoice, drive_link)
+                try:
+                    invoice_core.journal_invoice(current_invoice)
+                except Exception as journal_e:
+                    st.warning(f"Invoice saved, but it was not added to the e-invoice journal: {str(journal_e)}")
                 
                 # Auto increment local tracker after successful save
                 st.session_state.invoice_num_override = get_next_alpha_numeric(invoice_number)
@@ -811,8 +683,12 @@ if invoice_items:
                 else:    
                     st.success("Invoice successfully saved to sheets and downloaded! (Drive upload bypassed)")
                     
+            except GoogleQuotaError:
+                st.error("Failed to save invoice: Google Sheets is rate-limiting requests right now. Please try again in a minute.")
             except Exception as e:
                 st.error(f"Failed to save invoice: {str(e)}")
+            finally:
+                finish_profile(save_profiler)
                 
 
     with action2:
@@ -842,8 +718,20 @@ if invoice_items:
                     del st.session_state[key]
             
             # Fetch the factual latest invoice number from sheet directly
-            st.cache_data.clear() # Clear cache to ensure we get fresh data
+            catalog.invalidate() # Refresh the catalog in the background for everyone
             st.session_state.invoice_num_override = fetch_latest_invoice_number_from_sheet()
+            finish_rerun_profile()
             st.rerun()
+
+    with action3:
+        if einvoice_bytes:
+            st.download_button(
+                "⬇️ e-Invoice JSON",
+                data=einvoice_bytes,
+                file_name=f"{invoice_number}-einvoice.json",
+                mime="application/json"
+            )
 else:
     st.info("Please enter at least one product to see the invoice summary.")
+
+finish_rerun_profile()
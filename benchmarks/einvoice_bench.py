@@ -0,0 +1,69 @@
+# Per-invoice overhead of the e-invoice export.
+# Usage: python benchmarks/einvoice_bench.py [invoice_count] [items_per_invoice]
+import io
+import os
+import sys
+import time
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import einvoice
+
+BILLED_BY = {
+    "Company Name": "LilCoo Retail Pvt Ltd",
+    "Address Line 1": "12, 4th Cross, Indiranagar",
+    "Address Line 2": "Bengaluru 560038",
+    "State": "Karnataka",
+    "GSTIN": "29ABCDE1234F1Z5",
+    "Phone": "9876543210",
+}
+
+def make_invoice(n, items_per_invoice):
+    intra = n % 2 == 0
+    items = []
+    for i in range(items_per_invoice):
+        price, qty, gst = 100.0 + i, 1 + i % 5, 18
+        base = price * qty
+        cgst = sgst = base * gst / 2 / 100 if intra else 0
+        igst = 0 if intra else base * gst / 100
+        items.append({
+            "product": f"Product {i}", "hsn": "61112000", "mrp": 150, "disc_percent": 0.0,
+            "gst_percent": gst, "qty": qty, "price": price, "base_total": base,
+            "cgst": cgst, "sgst": sgst, "igst": igst, "total": base + cgst + sgst + igst,
+        })
+    return {
+        "invoice_number": f"A{n:05d}",
+        "invoice_date": datetime.date(2026, 10, 1),
+        "billed_by": BILLED_BY,
+        "client": {
+            "name": f"Client {n}", "address": "45 MG Road\nPune 411001",
+            "state": "Karnataka" if intra else "Maharashtra",
+            "gstin": "29AAACL1234C1Z2" if intra else "27AAACL1234C1Z2",
+            "pan": "AAACL1234C", "phone": "020-5551234",
+        },
+        "items": items,
+    }
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed * 1e6 / count:9.1f} us/invoice  ({count / elapsed:,.0f} invoices/s)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    items_per_invoice = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    invoices = [make_invoice(n, items_per_invoice) for n in range(count)]
+    payloads = [einvoice.build_einvoice(inv) for inv in invoices]
+
+    print(f"{count} invoices x {items_per_invoice} items")
+    timed("build", count, lambda: [einvoice.build_einvoice(inv) for inv in invoices])
+    timed("validate", count, lambda: [einvoice.validate_einvoice(p) for p in payloads])
+    timed("serialize", count, lambda: [einvoice.orjson.dumps(p) for p in payloads])
+
+    out = io.BytesIO()
+    timed("end-to-end stream", count, lambda: einvoice.write_einvoices(invoices, out))
+    print(f"output size            {out.tell() / 1024:,.1f} KB")
+
+if __name__ == "__main__":
+    main()
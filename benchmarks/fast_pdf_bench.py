@@ -0,0 +1,184 @@
+# Checks fast_pdf.render_fast() against invoice_pdf.generate_pdf() and
+# compares their throughput.
+# Usage: python benchmarks/fast_pdf_bench.py [iterations]
+import io
+import os
+import re
+import sys
+import time
+import zlib
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+import fast_pdf
+import invoice_pdf
+
+BILLED_BY = {
+    "Company Name": "LilCoo Retail Pvt Ltd",
+    "Address Line 1": "12, 4th Cross, Indiranagar",
+    "Address Line 2": "Bengaluru 560038",
+    "State": "Karnataka",
+    "GSTIN": "29ABCDE1234F1Z5",
+    "PAN": "ABCDE1234F",
+    "Phone": "9876543210",
+}
+NAMES = [
+    "Organic Cotton Romper – Sky Blue",
+    "Baby Blanket",
+    "A very long product name that will definitely wrap across several lines in the item column",
+    "Socks (3 pack) \\ assorted",
+    "Muslin Swaddle Set of Two ‘Premium’",
+    "Supercalifragilisticexpialidociousproductnamewithoutspaces",
+    "Bib  with  double  spaces",
+]
+
+def make_item(name, price, qty, gst, intra):
+    base = price * qty
+    cgst = sgst = base * gst / 2 / 100 if intra else 0
+    igst = 0 if intra else base * gst / 100
+    return {
+        "product": name, "hsn": "61112000", "mrp": 1499, "disc_percent": 0.0, "gst_percent": gst,
+        "qty": qty, "price": price, "base_total": base,
+        "cgst": cgst, "sgst": sgst, "igst": igst, "total": base + cgst + sgst + igst,
+    }
+
+def make_invoice(n_items, intra=True, address_lines=3, client_name="Tiny Tots Stores"):
+    address = "\n".join(["45 MG Road", "Near Metro", "Pune 411001", "Landmark", "Floor 2"][:address_lines])
+    return {
+        "invoice_number": "A00042",
+        "invoice_date": datetime.date(2026, 10, 19),
+        "due_date": datetime.date(2026, 10, 26),
+        "billed_by": BILLED_BY,
+        "from_state": "Karnataka",
+        "client": {
+            "name": client_name, "address": address,
+            "state": "Karnataka" if intra else "Maharashtra",
+            "gstin": "27AAACL1234C1Z2", "pan": "AAACL1234C", "phone": "020 5551234",
+        },
+        "items": [
+            make_item(NAMES[i % len(NAMES)], 812.5 + i * 13.37, 1 + i % 4, 18 if i % 2 else 5, intra)
+            for i in range(n_items)
+        ],
+    }
+
+def make_logo():
+    img = Image.new("RGBA", (472, 189), (255, 140, 0, 255))
+    for x in range(0, 472, 4):
+        img.putpixel((x, 10), (0, 0, 0, 0))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+# --- Minimal PDF reader for comparing drawn content ---
+OBJ_RE = re.compile(rb"(\d+) 0 obj\s*(.*?)endobj", re.S)
+STRING = rb"\(((?:\\.|[^\\)])*)\)"
+OPS_RE = re.compile(
+    rb"(?P<font>/F\d+) (?P<size>[\d.]+) Tf"
+    rb"|BT (?P<tx>-?[\d.]+) (?P<ty>-?[\d.]+) Td(?P<tj>.*?)ET"
+    rb"|(?P<rx>-?[\d.]+) (?P<ry>-?[\d.]+) (?P<rw>-?[\d.]+) (?P<rh>-?[\d.]+) re (?P<rop>[SBf])"
+    rb"|(?P<lx1>-?[\d.]+) (?P<ly1>-?[\d.]+) m (?P<lx2>-?[\d.]+) (?P<ly2>-?[\d.]+) l S"
+    rb"|(?P<ia>[\d.]+) 0 0 (?P<id>[\d.]+) (?P<ie>[\d.]+) (?P<if>[\d.]+) cm /I\d+ Do",
+    re.S,
+)
+
+def _unescape(s):
+    return re.sub(rb"\\(.)", lambda m: {b"r": b"\r", b"n": b"\n"}.get(m.group(1), m.group(1)), s)
+
+def extract(pdf_bytes):
+    objects = {int(m.group(1)): m.group(2) for m in OBJ_RE.finditer(pdf_bytes)}
+    def stream(body):
+        data = body.split(b"stream", 1)[1].split(b"endstream", 1)[0].strip(b"\r\n")
+        return zlib.decompress(data) if b"/FlateDecode" in body.split(b"stream", 1)[0] else data
+    def deref(body):
+        m = re.fullmatch(rb"\s*(\d+) 0 R\s*", body)
+        return objects[int(m.group(1))] if m else body
+
+    pages_root = next(b for b in objects.values() if re.search(rb"/Type\s*/Pages\b", b))
+    kids = [int(k) for k in re.findall(rb"(\d+) 0 R", re.search(rb"/Kids\s*\[(.*?)\]", pages_root, re.S).group(1))]
+    pages = []
+    for kid in kids:
+        page = objects[kid]
+        res_m = re.search(rb"/Resources\s*(\d+ 0 R|<<.*>>)\s*/", page, re.S) or re.search(rb"/Resources\s*(\d+ 0 R)", page)
+        resources = deref(res_m.group(1))
+        fonts = {}
+        for name, ref in re.findall(rb"(/F\d+)\s+(\d+) 0 R", resources):
+            fonts[name] = re.search(rb"/BaseFont\s*/([\w-]+)", objects[int(ref)]).group(1).decode()
+        content = stream(objects[int(re.search(rb"/Contents\s*(\d+) 0 R", page).group(1))])
+
+        font = None
+        texts, rects, lines, images = [], [], [], []
+        for m in OPS_RE.finditer(content):
+            if m.group("font"):
+                font = (fonts[m.group("font")], float(m.group("size")))
+            elif m.group("tx"):
+                text = b"".join(_unescape(s) for s in re.findall(STRING + rb"\s*Tj", m.group("tj")))
+                texts.append((font, float(m.group("tx")), float(m.group("ty")), text.decode("latin-1")))
+            elif m.group("rx"):
+                rects.append((float(m.group("rx")), float(m.group("ry")), float(m.group("rw")), float(m.group("rh")), m.group("rop").decode()))
+            elif m.group("lx1"):
+                lines.append(tuple(float(m.group(k)) for k in ("lx1", "ly1", "lx2", "ly2")))
+            else:
+                images.append(tuple(float(m.group(k)) for k in ("ia", "id", "ie", "if")))
+        pages.append({"texts": sorted(texts, key=str), "rects": sorted(rects), "lines": sorted(lines), "images": sorted(images)})
+    return pages
+
+def _close(a, b):
+    if isinstance(a, float):
+        return abs(a - b) <= 0.011
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    return a == b
+
+def compare(reference, candidate):
+    ref, cand = extract(reference), extract(candidate)
+    if len(ref) != len(cand):
+        return f"page count {len(ref)} != {len(cand)}"
+    for n, (rp, cp) in enumerate(zip(ref, cand), start=1):
+        for kind in ("texts", "rects", "lines", "images"):
+            if len(rp[kind]) != len(cp[kind]):
+                return f"page {n}: {len(rp[kind])} {kind} != {len(cp[kind])}"
+            for a, b in zip(rp[kind], cp[kind]):
+                if not _close(a, b):
+                    return f"page {n} {kind}: {a} != {b}"
+    return None
+
+
+def corpus():
+    for n_items in (1, 3, 8, 15, 22, 28, 40, 75):
+        for intra in (True, False):
+            yield f"{n_items} items {'CGST/SGST' if intra else 'IGST'}", make_invoice(n_items, intra)
+    yield "long client, 5 address lines", make_invoice(10, address_lines=5, client_name="A Very Long Client Name (Wholesale) Pvt Ltd")
+    yield "no client name", make_invoice(2, client_name="")
+    # Item counts that push the totals block onto the next page
+    for n_items in range(23, 31):
+        yield f"{n_items} items, totals near page end", make_invoice(n_items, intra=n_items % 2 == 0)
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    logo = make_logo()
+
+    failures = 0
+    for label, inv in corpus():
+        for logo_bytes in (None, logo):
+            ref = invoice_pdf.generate_pdf(inv, logo_bytes=logo_bytes)
+            fast = fast_pdf.render_fast(inv, logo_bytes=logo_bytes)
+            problem = compare(ref, fast)
+            if problem:
+                failures += 1
+                print(f"MISMATCH {label} (logo={bool(logo_bytes)}): {problem}")
+    print(f"parity check: {'OK' if not failures else f'{failures} mismatches'}")
+
+    inv = make_invoice(10)
+    for name, fn in (("fpdf2 generate_pdf", invoice_pdf.generate_pdf), ("fast_pdf.render_fast", fast_pdf.render_fast)):
+        fn(inv, logo_bytes=logo)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(inv, logo_bytes=logo)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22} {iterations / elapsed:8.1f} invoices/s  ({elapsed * 1000 / iterations:.2f} ms each)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Throughput of the invoice HTTP API against the in-memory Google backend.
+# Usage: python benchmarks/invoice_api_bench.py [requests] [concurrency] [workers] [queue] [fake_latency_s]
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import invoice_api
+
+def make_request(n, items_per_invoice=8):
+    intra = n % 2 == 0
+    return {
+        "invoice_date": "2026-10-01",
+        "client": {
+            "name": f"Client {n}", "address": "45 MG Road\nPune 411001",
+            "state": "Karnataka" if intra else "Maharashtra",
+            "gstin": "29AAACL1234C1Z2" if intra else "27AAACL1234C1Z2",
+            "pan": "AAACL1234C", "phone": "020-5551234",
+        },
+        "items": [
+            {"product": f"Product {i}", "hsn": "61112000", "mrp": 150, "qty": 1 + i % 5,
+             "price": 100.0 + i, "gst_percent": 18, "disc_percent": 5}
+            for i in range(items_per_invoice)
+        ],
+    }
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    queue = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+    latency = float(sys.argv[5]) if len(sys.argv) > 5 else 0.02
+
+    scheduler, spreadsheet, drive_factory = invoice_api.google_backend(fake=True, latency=latency)
+    service = invoice_api.InvoiceService(scheduler, spreadsheet, drive_factory, workers, queue)
+    server = invoice_api.make_server(service, port=0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    bodies = [json.dumps(make_request(n)).encode() for n in range(total)]
+    latencies, statuses, numbers = [], {}, []
+    lock = threading.Lock()
+    next_index = iter(range(total))
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            # Retry on 503 like a well-behaved client; latency includes the retries
+            start = time.perf_counter()
+            while True:
+                conn.request("POST", "/invoices", bodies[i], {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                payload = resp.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                if resp.status != 503:
+                    break
+                time.sleep(0.05)
+            with lock:
+                latencies.append(elapsed)
+                if resp.status == 200:
+                    numbers.append(json.loads(payload)["invoice_number"])
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    server.shutdown()
+    service.shutdown()
+
+    latencies.sort()
+    rows = spreadsheet.worksheet("Invoices").get_all_values()[1:]
+    in_order = [r[1] for r in rows] == sorted(r[1] for r in rows)
+    print(f"{total} requests, {concurrency} clients, {workers} workers, queue {queue}, fake latency {latency * 1000:.0f} ms")
+    print(f"throughput   {total / wall:8.1f} req/s")
+    print(f"p50          {percentile(latencies, 50) * 1000:8.1f} ms")
+    print(f"p99          {percentile(latencies, 99) * 1000:8.1f} ms")
+    print(f"status       {dict(sorted(statuses.items()))}")
+    print(f"sheet rows   {len(rows)} (unique numbers {len(set(numbers))}, in order: {in_order})")
+
+if __name__ == "__main__":
+    main()
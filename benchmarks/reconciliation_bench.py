@@ -0,0 +1,106 @@
+# Bank-statement reconciliation over a year of synthetic invoices.
+# Usage: python benchmarks/reconciliation_bench.py [invoice_count] [statement_lines]
+import csv
+import datetime
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import reconciliation
+
+FIRST = ["Sharma", "Gupta", "Rao", "Iyer", "Patel", "Reddy", "Nair", "Khan", "Das", "Mehta",
+         "Joshi", "Bose", "Menon", "Pillai", "Shetty", "Kulkarni", "Verma", "Singh", "Ghosh", "Kapoor"]
+SECOND = ["Stores", "Textiles", "Garments", "Kids", "Fashions", "Traders", "Agencies", "Retail",
+          "Boutique", "Mart", "Emporium", "Collections", "Wear", "Apparel", "Outlet"]
+PLACES = ["Indiranagar", "Jayanagar", "Koramangala", "Whitefield", "Malleshwaram", "Hebbal",
+          "Basavanagudi", "Yelahanka", "Banashankari", "Marathahalli"]
+
+def make_invoices(count, rng):
+    clients = [f"{f} {s} {p}" for f in FIRST for s in SECOND for p in PLACES]
+    start = datetime.date(2025, 10, 1)
+    values = [["S.No", "Invoice No", "Date", "Due Date", "Client Name", "Subtotal",
+               "CGST", "SGST", "IGST", "Grand Total", "Drive Link"]]
+    for n in range(count):
+        date = start + datetime.timedelta(days=n * 365 // count)
+        total = round(rng.uniform(500, 50000), 2)
+        values.append([n + 1, f"A{n + 1:05d}", date.isoformat(), "", rng.choice(clients),
+                       "", "", "", "", f"{total:,.2f}", ""])
+    return values
+
+# Header rows and date formats as the banks export them; each row maps the
+# statement fields (date, narration, ref, debit, credit) onto the columns
+LAYOUTS = {
+    "generic": (["Date", "Narration", "Ref No", "Debit", "Credit", "Balance"], "%d/%m/%Y",
+                lambda n, d, narr, ref, dr, cr: [d, narr, ref, dr, cr, "0"]),
+    "hdfc": (["Date", "Narration", "Chq./Ref.No.", "Value Dt", "Withdrawal Amt.", "Deposit Amt.", "Closing Balance"], "%d/%m/%y",
+             lambda n, d, narr, ref, dr, cr: [d, narr, ref, d, dr, cr, "0.00"]),
+    "icici": (["S No.", "Value Date", "Transaction Date", "Cheque Number", "Transaction Remarks",
+               "Withdrawal Amount (INR )", "Deposit Amount (INR )", "Balance (INR )"], "%d/%m/%Y",
+              lambda n, d, narr, ref, dr, cr: [n + 1, d, d, ref, narr, dr or "0.00", cr or "0.00", "0.00"]),
+    "sbi": (["Txn Date", "Value Date", "Description", "Ref No./Cheque No.", "Debit", "Credit", "Balance"], "%d %b %Y",
+            lambda n, d, narr, ref, dr, cr: [d, d, narr, ref, dr, cr, "0.00"]),
+}
+
+def make_statement(values, lines, rng, layout="generic"):
+    header, date_format, make_row = LAYOUTS[layout]
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(header)
+    invoices = values[1:]
+    for n in range(lines):
+        inv = rng.choice(invoices)
+        date = (datetime.date.fromisoformat(inv[2]) + datetime.timedelta(days=rng.randint(0, 30))).strftime(date_format)
+        total = float(inv[9].replace(",", ""))
+        kind = rng.random()
+        if kind < 0.3:
+            narration, credit = f"NEFT-{inv[1]}-{inv[4].upper()}", total
+        elif kind < 0.6:
+            narration, credit = f"IMPS/{inv[4].upper()}/PAYMENT", total
+        elif kind < 0.75:
+            narration, credit = f"UPI-{inv[4].split()[0].upper()} {inv[4].split()[1].upper()}", round(total / 2, 2)
+        elif kind < 0.85:
+            narration, credit = "CASH DEPOSIT", total
+        else:
+            writer.writerow(make_row(n, date, "ATM WDL", f"W{n:07d}", f"{rng.randint(500, 5000)}.00", ""))
+            continue
+        writer.writerow(make_row(n, date, narration, f"UTR{n:09d}", "", f"{credit:.2f}"))
+    return out.getvalue()
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<20} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 25000
+    rng = random.Random(42)
+    values = make_invoices(count, rng)
+    statement = make_statement(values, lines, random.Random(7))
+    print(f"{count} invoices, {lines} statement lines")
+
+    start = time.perf_counter()
+    txns = timed("parse statement", lambda: reconciliation.parse_bank_statement(statement, "bench.csv"))
+    invoices = timed("read invoices", lambda: reconciliation.invoices_from_sheet(values))
+    results, unmatched = timed("reconcile", lambda: reconciliation.reconcile(invoices, txns))
+    timed("writeback values", lambda: reconciliation.writeback_values(values[0], invoices, results))
+    print(f"{'total':<20} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    statuses = {}
+    for res in results.values():
+        statuses[res["status"]] = statuses.get(res["status"], 0) + 1
+    print(f"credits {len(txns)}, unmatched credits {len(unmatched)}, invoices {statuses}")
+
+    # The same statement in each bank's export layout must parse to the same credits
+    for layout in LAYOUTS:
+        parsed = reconciliation.parse_bank_statement(make_statement(values, lines, random.Random(7), layout), layout)
+        same = [(t["date"], t["narration"], t["amount"], t["ref"]) for t in parsed] == \
+               [(t["date"], t["narration"], t["amount"], t["ref"]) for t in txns]
+        print(f"layout {layout:<8} credits {len(parsed)}, same as generic: {same}")
+
+if __name__ == "__main__":
+    main()
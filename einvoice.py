@@ -0,0 +1,343 @@
+import re
+import sys
+import argparse
+import datetime
+import fastjsonschema
+import orjson
+
+# GST e-invoice (IRN) export.
+# Maps the invoice model used by app.py (billed-by sheet row, client dict and
+# line items with HSN, rate and tax split) to the INV-01 v1.1 JSON schema.
+
+EINVOICE_VERSION = "1.1"
+
+# GST state codes, keyed by the names used in the STATES dropdown
+STATE_CODES = {
+    "Jammu and Kashmir": "01", "Himachal Pradesh": "02", "Punjab": "03",
+    "Chandigarh": "04", "Uttarakhand": "05", "Haryana": "06", "Delhi": "07",
+    "Rajasthan": "08", "Uttar Pradesh": "09", "Bihar": "10", "Sikkim": "11",
+    "Arunachal Pradesh": "12", "Nagaland": "13", "Manipur": "14", "Mizoram": "15",
+    "Tripura": "16", "Meghalaya": "17", "Assam": "18", "West Bengal": "19",
+    "Jharkhand": "20", "Odisha": "21", "Chhattisgarh": "22", "Madhya Pradesh": "23",
+    "Gujarat": "24", "Dadra and Nagar Haveli and Daman and Diu": "26",
+    "Maharashtra": "27", "Karnataka": "29", "Goa": "30", "Lakshadweep": "31",
+    "Kerala": "32", "Tamil Nadu": "33", "Puducherry": "34",
+    "Andaman and Nicobar Islands": "35", "Telangana": "36", "Andhra Pradesh": "37",
+    "Ladakh": "38", "Other": "97"
+}
+STATE_NAMES = {code: name for name, code in STATE_CODES.items()}
+
+PIN_RE = re.compile(r"\b([1-9][0-9]{5})\b")
+
+_AMOUNT = {"type": "number", "minimum": 0}
+_STCD = {"type": "string", "pattern": "^[0-9]{2}$"}
+_GSTIN = {"type": "string", "pattern": "^[0-9]{2}[0-9A-Z]{13}$"}
+
+def _party_schema(extra_required=()):
+    return {
+        "type": "object",
+        "required": ["Gstin", "LglNm", "Addr1", "Loc", "Pin", "Stcd", *extra_required],
+        "properties": {
+            "Gstin": _GSTIN,
+            "LglNm": {"type": "string", "minLength": 3, "maxLength": 100},
+            "Addr1": {"type": "string", "minLength": 1, "maxLength": 100},
+            "Addr2": {"type": "string", "maxLength": 100},
+            "Loc": {"type": "string", "minLength": 3, "maxLength": 50},
+            "Pin": {"type": "integer", "minimum": 100000, "maximum": 999999},
+            "Stcd": _STCD,
+            "Pos": _STCD,
+            "Ph": {"type": "string", "pattern": "^[0-9]{6,12}$"},
+        },
+    }
+
+# Subset of the NIC INV-01 v1.1 schema covering the fields we populate
+EINVOICE_SCHEMA = {
+    "type": "object",
+    "required": ["Version", "TranDtls", "DocDtls", "SellerDtls", "BuyerDtls", "ItemList", "ValDtls"],
+    "properties": {
+        "Version": {"const": EINVOICE_VERSION},
+        "TranDtls": {
+            "type": "object",
+            "required": ["TaxSch", "SupTyp"],
+            "properties": {
+                "TaxSch": {"const": "GST"},
+                "SupTyp": {"enum": ["B2B", "SEZWP", "SEZWOP", "EXPWP", "EXPWOP", "DEXP"]},
+                "RegRev": {"enum": ["Y", "N"]},
+                "IgstOnIntra": {"enum": ["Y", "N"]},
+            },
+        },
+        "DocDtls": {
+            "type": "object",
+            "required": ["Typ", "No", "Dt"],
+            "properties": {
+                "Typ": {"enum": ["INV", "CRN", "DBN"]},
+                "No": {"type": "string", "pattern": "^[A-Za-z1-9][A-Za-z0-9/-]{0,15}$"},
+                "Dt": {"type": "string", "pattern": "^[0-3][0-9]/[0-1][0-9]/[2][0][0-9]{2}$"},
+            },
+        },
+        "SellerDtls": _party_schema(),
+        "BuyerDtls": _party_schema(extra_required=("Pos",)),
+        "ItemList": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": 1000,
+            "items": {
+                "type": "object",
+                "required": ["SlNo", "IsServc", "HsnCd", "UnitPrice", "TotAmt", "AssAmt", "GstRt", "TotItemVal"],
+                "properties": {
+                    "SlNo": {"type": "string", "pattern": "^[0-9]{1,6}$"},
+                    "PrdDesc": {"type": "string", "maxLength": 300},
+                    "IsServc": {"enum": ["Y", "N"]},
+                    "HsnCd": {"type": "string", "pattern": "^[0-9]{4,8}$"},
+                    "Qty": _AMOUNT,
+                    "Unit": {"type": "string", "minLength": 3, "maxLength": 8},
+                    "UnitPrice": _AMOUNT,
+                    "TotAmt": _AMOUNT,
+                    "Discount": _AMOUNT,
+                    "AssAmt": _AMOUNT,
+                    "GstRt": _AMOUNT,
+                    "IgstAmt": _AMOUNT,
+                    "CgstAmt": _AMOUNT,
+                    "SgstAmt": _AMOUNT,
+                    "TotItemVal": _AMOUNT,
+                },
+            },
+        },
+        "ValDtls": {
+            "type": "object",
+            "required": ["AssVal", "TotInvVal"],
+            "properties": {
+                "AssVal": _AMOUNT,
+                "CgstVal": _AMOUNT,
+                "SgstVal": _AMOUNT,
+                "IgstVal": _AMOUNT,
+                "TotInvVal": _AMOUNT,
+            },
+        },
+    },
+}
+
+# Compiled once at import; the generated validator is plain Python and far
+# cheaper per call than interpreting the schema for every invoice.
+_validate_schema = fastjsonschema.compile(EINVOICE_SCHEMA)
+
+
+class EInvoiceValidationError(ValueError):
+    def __init__(self, invoice_no, message):
+        super().__init__(f"{invoice_no}: {message}")
+        self.invoice_no = invoice_no
+        self.message = message
+
+
+def state_code(state, gstin=""):
+    # The GSTIN prefix is authoritative; fall back to the state name
+    gstin = str(gstin or "").strip()
+    if len(gstin) >= 2 and gstin[:2].isdigit():
+        return gstin[:2]
+    return STATE_CODES.get(state, "")
+
+def _pin(*texts):
+    for text in texts:
+        match = PIN_RE.search(str(text or ""))
+        if match:
+            return int(match.group(1))
+    return 0
+
+def _phone(value):
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-12:] if digits else ""
+
+def _amt(value):
+    return round(float(value or 0), 2)
+
+def _party(gstin, name, address_lines, state, phone):
+    lines = [l.strip() for l in address_lines if l and str(l).strip()]
+    party = {
+        "Gstin": str(gstin or "").strip().upper(),
+        "LglNm": str(name or "").strip(),
+        "Addr1": lines[0][:100] if lines else "",
+        # No city field in the sheets, so the state name stands in as location
+        "Loc": str(state or "").strip(),
+        "Pin": _pin(*reversed(lines)),
+        "Stcd": state_code(state, gstin),
+    }
+    if len(lines) > 1:
+        party["Addr2"] = ", ".join(lines[1:])[:100]
+    ph = _phone(phone)
+    if len(ph) >= 6:
+        party["Ph"] = ph
+    return party
+
+def build_einvoice(invoice):
+    """Map one invoice to an e-invoice payload (not validated).
+
+    `invoice` is a dict with invoice_number, invoice_date (date), billed_by
+    (the 'Billed By' sheet row), client (name/address/state/gstin/phone, as in
+    MOCK_CLIENTS) and items (the invoice_items rows built in app.py).
+    """
+    billed_by = invoice["billed_by"]
+    client = invoice["client"]
+    inv_date = invoice["invoice_date"]
+    if isinstance(inv_date, (datetime.date, datetime.datetime)):
+        inv_date = inv_date.strftime("%d/%m/%Y")
+
+    # Stcd decides the tax split, so never guess it: take the State column,
+    # else the state the GSTIN was issued in, else refuse
+    seller_gstin = str(billed_by.get("GSTIN", "") or "").strip()
+    seller_state = str(billed_by.get("State", "") or "").strip() or STATE_NAMES.get(seller_gstin[:2], "")
+    if not state_code(seller_state, seller_gstin):
+        raise EInvoiceValidationError(
+            str(invoice["invoice_number"]), "seller state unknown: Billed By has no State or GSTIN"
+        )
+    seller = _party(
+        seller_gstin,
+        billed_by.get("Company Name", ""),
+        [billed_by.get("Address Line 1", ""), billed_by.get("Address Line 2", "")],
+        seller_state,
+        billed_by.get("Phone", ""),
+    )
+    buyer = _party(
+        client.get("gstin", ""),
+        client.get("name", ""),
+        str(client.get("address", "")).split("\n"),
+        client.get("state", ""),
+        client.get("phone", ""),
+    )
+    buyer["Pos"] = buyer["Stcd"]
+
+    item_list = []
+    ass_val = cgst_val = sgst_val = igst_val = tot_val = 0.0
+    for idx, item in enumerate(invoice["items"]):
+        base_total = _amt(item["base_total"])
+        cgst, sgst, igst = _amt(item["cgst"]), _amt(item["sgst"]), _amt(item["igst"])
+        total = _amt(item["total"])
+        item_list.append({
+            "SlNo": str(idx + 1),
+            "PrdDesc": str(item.get("product", ""))[:300],
+            "IsServc": "N",
+            "HsnCd": str(item.get("hsn", "")).strip(),
+            "Qty": item["qty"],
+            "Unit": "NOS",
+            # Rate is already net of the line discount
+            "UnitPrice": _amt(item["price"]),
+            "TotAmt": base_total,
+            "Discount": 0,
+            "AssAmt": base_total,
+            "GstRt": item["gst_percent"],
+            "IgstAmt": igst,
+            "CgstAmt": cgst,
+            "SgstAmt": sgst,
+            "TotItemVal": total,
+        })
+        ass_val += base_total
+        cgst_val += cgst
+        sgst_val += sgst
+        igst_val += igst
+        tot_val += total
+
+    return {
+        "Version": EINVOICE_VERSION,
+        "TranDtls": {"TaxSch": "GST", "SupTyp": "B2B", "RegRev": "N", "IgstOnIntra": "N"},
+        "DocDtls": {"Typ": "INV", "No": str(invoice["invoice_number"]), "Dt": inv_date},
+        "SellerDtls": seller,
+        "BuyerDtls": buyer,
+        "ItemList": item_list,
+        "ValDtls": {
+            "AssVal": round(ass_val, 2),
+            "CgstVal": round(cgst_val, 2),
+            "SgstVal": round(sgst_val, 2),
+            "IgstVal": round(igst_val, 2),
+            "TotInvVal": round(tot_val, 2),
+        },
+    }
+
+def validate_einvoice(payload):
+    try:
+        _validate_schema(payload)
+    except fastjsonschema.JsonSchemaValueException as e:
+        invoice_no = payload.get("DocDtls", {}).get("No", "")
+        raise EInvoiceValidationError(invoice_no, e.message) from None
+    return payload
+
+def is_b2b(invoice):
+    return bool(str(invoice["client"].get("gstin", "")).strip())
+
+def einvoice_json(invoice):
+    return orjson.dumps(validate_einvoice(build_einvoice(invoice)))
+
+def write_einvoices(invoices, fp):
+    """Stream a JSON array of e-invoices for the B2B invoices to a binary file.
+
+    Invoices are built, validated and written one at a time so memory stays
+    flat however many are exported. Returns (written_count, errors) where
+    errors is a list of EInvoiceValidationError for the skipped invoices.
+    """
+    written = 0
+    errors = []
+    fp.write(b"[")
+    for invoice in invoices:
+        if not is_b2b(invoice):
+            continue
+        try:
+            payload = validate_einvoice(build_einvoice(invoice))
+        except EInvoiceValidationError as e:
+            errors.append(e)
+            continue
+        if written:
+            fp.write(b",")
+        fp.write(orjson.dumps(payload))
+        written += 1
+    fp.write(b"]")
+    return written, errors
+
+def read_invoices_jsonl(fp, errors):
+    """Yield invoices from a JSON-lines file, one invoice per line.
+
+    Each line has the shape build_einvoice() takes, with ISO dates; this is
+    what the page and invoice_api.py append to invoice_core.JOURNAL_PATH. Lines that are not valid JSON are
+    recorded in `errors` and skipped.
+    """
+    for line_no, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            invoice = orjson.loads(line)
+            for key in ("invoice_date", "due_date"):
+                if isinstance(invoice.get(key), str):
+                    invoice[key] = datetime.date.fromisoformat(invoice[key])
+        except (orjson.JSONDecodeError, ValueError, AttributeError) as e:
+            errors.append(EInvoiceValidationError(f"line {line_no}", str(e)))
+            continue
+        yield invoice
+
+# --- BULK EXPORT CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export B2B invoices as GST e-invoice JSON")
+    parser.add_argument("input", nargs="?", default=None,
+                        help="JSON-lines invoice file ('-' for stdin; default the saved-invoice journal)")
+    parser.add_argument("-o", "--output", default="-", help="output JSON file (default stdout)")
+    args = parser.parse_args(argv)
+
+    if args.input is None:
+        # Imported here so validating e-invoices does not pull in the Google clients
+        import invoice_core
+        args.input = invoice_core.JOURNAL_PATH
+    read_errors = []
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    dst = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        written, errors = write_einvoices(read_invoices_jsonl(src, read_errors), dst)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if dst is not sys.stdout.buffer:
+            dst.close()
+
+    errors = read_errors + errors
+    for e in errors:
+        print(f"Skipped {e}", file=sys.stderr)
+    print(f"Wrote {written} e-invoices, skipped {len(errors)}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
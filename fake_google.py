@@ -0,0 +1,140 @@
+import itertools
+import threading
+import time
+import gspread
+
+# In-memory stand-ins for the gspread spreadsheet and Drive service objects
+# the app talks to, for running invoice_api.py and benchmarks without
+# credentials. Every call sleeps `latency` seconds to mimic a round trip.
+
+INVOICE_HEADERS = [
+    "S.No", "Invoice No", "Date", "Due Date", "Client Name", "Subtotal",
+    "CGST", "SGST", "IGST", "Grand Total", "Drive Link"
+]
+
+# The fake backend has no quota, so let the scheduler through unthrottled
+FAKE_LIMITS = {"sheets": (1000.0, 1000), "drive": (1000.0, 1000)}
+
+
+class FakeWorksheet:
+    def __init__(self, title, rows, latency=0.0):
+        self.title = title
+        self._rows = [list(r) for r in rows]
+        self._latency = latency
+        self._lock = threading.Lock()
+
+    @property
+    def col_count(self):
+        with self._lock:
+            return max((len(r) for r in self._rows), default=0)
+
+    def _round_trip(self):
+        if self._latency:
+            time.sleep(self._latency)
+
+    def get_all_values(self):
+        self._round_trip()
+        with self._lock:
+            return [list(r) for r in self._rows]
+
+    def get_all_records(self):
+        self._round_trip()
+        with self._lock:
+            if not self._rows:
+                return []
+            header = self._rows[0]
+            return [dict(zip(header, r)) for r in self._rows[1:]]
+
+    def row_values(self, row, **kwargs):
+        # 1-based like gspread; a row past the end is empty
+        self._round_trip()
+        with self._lock:
+            return list(self._rows[row - 1]) if row <= len(self._rows) else []
+
+    def append_row(self, values, **kwargs):
+        self._round_trip()
+        with self._lock:
+            self._rows.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self._round_trip()
+        with self._lock:
+            self._rows.extend(list(r) for r in values)
+
+    def add_cols(self, cols):
+        self._round_trip()
+
+    def update(self, range_name=None, values=None, **kwargs):
+        # Only whole-row writes from the first data row, as used by reconciliation
+        self._round_trip()
+        with self._lock:
+            col = gspread.utils.a1_to_rowcol(range_name.split(":")[0])[1] - 1
+            for offset, row in enumerate(values or []):
+                i = offset + 1
+                while len(self._rows) <= i:
+                    self._rows.append([])
+                target = self._rows[i]
+                if len(target) < col + len(row):
+                    target.extend([""] * (col + len(row) - len(target)))
+                target[col:col + len(row)] = row
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheets=None, latency=0.0):
+        self._latency = latency
+        self._worksheets = {
+            name: FakeWorksheet(name, rows, latency)
+            for name, rows in (sheets if sheets is not None else default_sheets()).items()
+        }
+
+    def worksheet(self, name):
+        if self._latency:
+            time.sleep(self._latency)
+        try:
+            return self._worksheets[name]
+        except KeyError:
+            raise gspread.WorksheetNotFound(name)
+
+
+class _FakeRequest:
+    def __init__(self, fn):
+        self.execute = fn
+
+
+class _FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def create(self, body=None, media_body=None, fields=None):
+        return _FakeRequest(lambda: self._drive._create(body or {}, media_body))
+
+
+class FakeDrive:
+    def __init__(self, latency=0.0):
+        self._latency = latency
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.files_by_id = {}
+
+    def files(self):
+        return _FakeFiles(self)
+
+    def _create(self, body, media_body):
+        if self._latency:
+            time.sleep(self._latency)
+        data = media_body.getbytes(0, media_body.size()) if media_body is not None else b""
+        with self._lock:
+            file_id = f"fake{next(self._ids):06d}"
+            self.files_by_id[file_id] = (body.get("name", ""), data)
+        return {"id": file_id, "webViewLink": f"https://drive.example.invalid/file/d/{file_id}/view"}
+
+
+def default_sheets():
+    return {
+        "Billed By": [
+            ["Company Name", "Address Line 1", "Address Line 2", "State", "GSTIN", "PAN", "Phone"],
+            ["LilCoo Test Traders", "12 MG Road", "Bengaluru 560001", "Karnataka",
+             "29ABCDE1234F1Z5", "ABCDE1234F", "9800000000"],
+        ],
+        "Invoices": [INVOICE_HEADERS],
+    }
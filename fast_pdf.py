@@ -0,0 +1,466 @@
+import io
+import zlib
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+from PIL import Image
+from invoice_pdf import clean_text, generate_pdf, PDF_LOGO_WIDTH_MM
+
+# Fast path for batch jobs: writes the PDF for the fixed invoice layout
+# directly, instead of going through fpdf2's general cell / page-break
+# machinery. Geometry mirrors invoice_pdf.generate_pdf() (same fpdf2 margins,
+# Helvetica metrics, wrapping and page-break rules), so the two produce the
+# same text runs, rules and boxes. Anything outside the fixed layout falls
+# back to generate_pdf().
+
+K = 72 / 25.4                   # points per mm
+PAGE_W_PT, PAGE_H_PT = 595.28, 841.89
+PAGE_W = PAGE_W_PT / K
+PAGE_H = PAGE_H_PT / K
+MARGIN = 28.35 / K              # fpdf2 default margins
+C_MARGIN = MARGIN / 10.0        # fpdf2 interior cell margin
+BREAK_TRIGGER = PAGE_H - 50     # set_auto_page_break(margin=50)
+FLOAT_TOLERANCE = 1e-9
+
+# Font resource names; "B" is bold, "" regular
+FONT_RES = {"B": "/F1", "": "/F2"}
+FONT_BASE = {"B": "Helvetica-Bold", "": "Helvetica"}
+_cw_bold = CORE_FONTS_CHARWIDTHS["helveticaB"]
+_cw_regular = CORE_FONTS_CHARWIDTHS["helvetica"]
+CHAR_WIDTHS = {
+    "B": [_cw_bold.get(chr(i), 0) for i in range(256)],
+    "": [_cw_regular.get(chr(i), 0) for i in range(256)],
+}
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "(": "\\(", ")": "\\)", "\r": "\\r"})
+NB_ALIAS = "\x00nb\x00"
+
+
+class FastPathUnsupported(Exception):
+    """The invoice does not fit the fixed layout; use generate_pdf() instead."""
+
+
+def text_width(text, style, size):
+    cw = CHAR_WIDTHS[style]
+    return sum(cw[ord(c)] for c in text) * size * 0.001 / K
+
+def wrap_lines(text, width, style, size):
+    # Same rules as fpdf2's MultiLineBreak for a single core-font fragment:
+    # break at the last space, drop a space that overflows, else break mid-word
+    cw = CHAR_WIDTHS[style]
+    scale = size * 0.001 / K
+    max_w = width - 2 * C_MARGIN
+    lines = []
+    start = 0
+    i = 0
+    units = 0
+    space_at = None
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == "\n":
+            lines.append(text[start:i])
+            i += 1
+            start, units, space_at = i, 0, None
+            continue
+        w = cw[ord(c)]
+        if (units + w) * scale - max_w > FLOAT_TOLERANCE:
+            if c == " ":
+                lines.append(text[start:i])
+                i += 1
+            elif space_at is not None:
+                lines.append(text[start:space_at])
+                i = space_at + 1
+            elif i == start:
+                raise FastPathUnsupported("Column too narrow for a single character")
+            else:
+                lines.append(text[start:i])
+            start, units, space_at = i, 0, None
+            continue
+        if c == " ":
+            space_at = i
+        units += w
+        i += 1
+    if units:
+        lines.append(text[start:])
+    return lines
+
+
+_image_cache = {}
+
+def _image_objects(logo_bytes):
+    # Decoded once per distinct logo and reused by every invoice in the batch
+    cached = _image_cache.get(logo_bytes)
+    if cached is not None:
+        return cached
+    img = Image.open(io.BytesIO(logo_bytes))
+    if img.mode in ("P", "LA", "PA") or "transparency" in img.info:
+        img = img.convert("RGBA")
+    smask = None
+    if img.mode == "RGBA":
+        smask = img.getchannel("A")
+        img = img.convert("RGB")
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    colorspace = "/DeviceGray" if img.mode == "L" else "/DeviceRGB"
+    cached = {
+        "w": img.width,
+        "h": img.height,
+        "colorspace": colorspace,
+        "data": zlib.compress(img.tobytes()),
+        "smask": zlib.compress(smask.tobytes()) if smask is not None else None,
+    }
+    _image_cache.clear()  # only ever one logo in use
+    _image_cache[logo_bytes] = cached
+    return cached
+
+
+class _Writer:
+    def __init__(self, footer_info):
+        self.footer_info = footer_info
+        self.pages = []
+        self.ops = None
+        self.x = MARGIN
+        self.y = MARGIN
+        self.l_margin = MARGIN
+        self.style = ""
+        self.size = 12
+        self.page_font = None
+
+    # --- page handling ---
+    def add_page(self):
+        if self.ops is not None:
+            self.footer()
+        self.ops = ["2 J", "0.57 w"]
+        self.pages.append(self.ops)
+        self.page_font = None
+        self.x = self.l_margin
+        self.y = MARGIN
+
+    def will_page_break(self, h):
+        return self.y + h > BREAK_TRIGGER
+
+    def footer(self):
+        inv_no, inv_date, billed_to = self.footer_info
+        style, size = self.style, self.size
+        self.y = PAGE_H - 35
+        self.x = self.l_margin
+        y_pt = f"{(PAGE_H - self.y) * K:.2f}"
+        self.ops.append(f"{self.x * K:.2f} {y_pt} m {(210 - self.x) * K:.2f} {y_pt} l S")
+        self.ln(2)
+        self.set_font("B", 9)
+        self.cell(40, 4, "Invoice No")
+        self.cell(40, 4, "Invoice Date")
+        self.cell(0, 4, "Billed To", nl=True)
+        self.set_font("", 9)
+        self.cell(40, 4, inv_no)
+        self.cell(40, 4, inv_date)
+        self.cell(0, 4, billed_to, nl=True)
+        self.ln(5)
+        self.set_font("B", 9)
+        self.cell(0, 6, f"Page {len(self.pages)} of {NB_ALIAS}", nl=True)
+        self.set_font("", 8)
+        self.cell(0, 4, "This is an electronically generated document, no signature is required.", nl=True, gray=True)
+        self.style, self.size = style, size
+
+    # --- drawing primitives (fpdf2 cell semantics) ---
+    def set_font(self, style, size):
+        self.style, self.size = style, size
+
+    def ln(self, h):
+        self.x = self.l_margin
+        self.y += h
+
+    def cell(self, w, h, text="", border=0, align="L", fill=False, nl=False, gray=False, auto_break=False):
+        if auto_break and self.will_page_break(h):
+            x = self.x
+            self.add_page()
+            self.x = x
+        ops = self.ops
+        x, y = self.x, self.y
+        if w == 0:
+            w = PAGE_W - MARGIN - x
+        if fill or border:
+            left = x * K
+            top = (PAGE_H - y) * K
+            rect = f"{left:.2f} {top:.2f} {(x + w) * K - left:.2f} {(PAGE_H - (y + h)) * K - top:.2f} re"
+            if fill:
+                ops.append(f"q 0.9412 g {rect} {'B' if border else 'f'} Q")
+            else:
+                ops.append(f"{rect} S")
+        if text:
+            self._text(text, x, y, w, h, align, gray)
+        if nl:
+            self.x = self.l_margin
+            self.y = y + h
+        else:
+            self.x = x + w
+
+    def _text(self, text, x, y, w, h, align, gray=False):
+        style, size = self.style, self.size
+        if self.page_font != (style, size):
+            self.ops.append(f"BT {FONT_RES[style]} {size:.2f} Tf ET")
+            self.page_font = (style, size)
+        if align == "R":
+            tx = x + w - C_MARGIN - text_width(text, style, size)
+        elif align == "C":
+            tx = x + (w - text_width(text, style, size)) / 2
+        else:
+            tx = x + C_MARGIN
+        ty = (PAGE_H - y - 0.5 * h - 0.3 * (size / K)) * K
+        op = f"BT {tx * K:.2f} {ty:.2f} Td ({text.translate(_ESCAPES)}) Tj ET"
+        self.ops.append(f"q 0.502 g {op} Q" if gray else op)
+
+    def rect(self, x, y, w, h):
+        left = x * K
+        top = (PAGE_H - y) * K
+        self.ops.append(f"{left:.2f} {top:.2f} {(x + w) * K - left:.2f} {(PAGE_H - (y + h)) * K - top:.2f} re S")
+
+    def image(self, name, x, y, w, h):
+        self.ops.append(f"q {w * K:.2f} 0 0 {h * K:.2f} {x * K:.2f} {(PAGE_H - (y + h)) * K:.2f} cm /{name} Do Q")
+
+
+# Table columns: (width, header, align)
+_HEAD = [(7, "", "C"), (44, "Item", "L"), (15, "HSN", "C"), (11, "MRP", "R"), (9, "GST%", "C"),
+         (14, "Rate", "R"), (9, "Qty", "C"), (20, "Amount", "R")]
+_HEAD_IGST = _HEAD + [(36, "IGST", "R"), (25, "Total", "R")]
+_HEAD_GST = _HEAD + [(18, "CGST", "R"), (18, "SGST", "R"), (25, "Total", "R")]
+
+
+def render_fast(invoice, logo_bytes=None):
+    """Render `invoice` (same shape as invoice_pdf.generate_pdf) to PDF bytes.
+
+    Raises FastPathUnsupported when the invoice does not fit the fixed layout.
+    """
+    invoice_number = invoice["invoice_number"]
+    invoice_date = invoice["invoice_date"]
+    due_date = invoice["due_date"]
+    billed_by = invoice["billed_by"]
+    client = invoice["client"]
+    to_name, to_address, to_state = client["name"], client["address"], client["state"]
+    to_gstin, to_pan, to_phone = client["gstin"], client["pan"], client["phone"]
+    items = invoice["items"]
+    is_igst = invoice["from_state"] != to_state
+
+    subtotal = sum(item["base_total"] for item in items)
+    total_cgst = sum(item["cgst"] for item in items)
+    total_sgst = sum(item["sgst"] for item in items)
+    total_igst = sum(item["igst"] for item in items)
+    grand_total = sum(item["total"] for item in items)
+
+    pdf = _Writer((
+        clean_text(invoice_number),
+        invoice_date.strftime('%d %b %Y'),
+        clean_text(to_name) if to_name else "Client Name",
+    ))
+    pdf.add_page()
+
+    logo = None
+    if logo_bytes:
+        try:
+            logo = _image_objects(logo_bytes)
+        except Exception:
+            logo = None
+    if logo:
+        pdf.image("I1", 155, 10, PDF_LOGO_WIDTH_MM, PDF_LOGO_WIDTH_MM * logo["h"] / logo["w"])
+
+    # Header
+    pdf.set_font("B", 24)
+    pdf.y = 15
+    pdf.x = pdf.l_margin
+    pdf.cell(100, 10, "INVOICE", nl=True)
+    pdf.ln(5)
+    for label, value in (
+        ("Invoice Number:", clean_text(invoice_number)),
+        ("Invoice Date:", invoice_date.strftime('%d %b %Y')),
+        ("Due Date:", due_date.strftime('%d %b %Y')),
+    ):
+        pdf.set_font("B", 10)
+        pdf.cell(35, 6, label)
+        pdf.set_font("", 10)
+        pdf.cell(65, 6, value, nl=True)
+    pdf.ln(15)
+
+    # Billed By (left)
+    y_before_address = pdf.y
+    pdf.set_font("B", 12)
+    pdf.cell(100, 6, "Billed By", nl=True)
+    pdf.set_font("B", 10)
+    if billed_by.get('Company Name'):
+        pdf.cell(100, 5, clean_text(billed_by.get('Company Name', '')), nl=True)
+    pdf.set_font("", 10)
+    for key, prefix in (("Address Line 1", ""), ("Address Line 2", ""), ("GSTIN", "GSTIN: "), ("PAN", "PAN: "), ("Phone", "Phone: ")):
+        if billed_by.get(key):
+            pdf.cell(100, 5, clean_text(f"{prefix}{billed_by.get(key, '')}"), nl=True)
+    if pdf.y > BREAK_TRIGGER:
+        raise FastPathUnsupported("Billed By block overflows the first page")
+
+    # Billed To (right)
+    pdf.y = y_before_address
+    pdf.l_margin = pdf.x = 115
+    pdf.set_font("B", 12)
+    pdf.cell(0, 6, "Billed To", nl=True)
+    pdf.set_font("B", 10)
+    if to_name:
+        pdf.cell(0, 5, clean_text(to_name), nl=True)
+    pdf.set_font("", 10)
+    for line in to_address.split('\n'):
+        if line.strip():
+            pdf.cell(0, 5, clean_text(line.strip()), nl=True)
+    pdf.cell(0, 5, clean_text(f"State: {to_state}"), nl=True)
+    if to_gstin:
+        pdf.cell(0, 5, clean_text(f"GSTIN: {to_gstin}"), nl=True)
+    if to_pan:
+        pdf.cell(0, 5, clean_text(f"PAN: {to_pan}"), nl=True)
+    if to_phone and str(to_phone).strip() != "":
+        pdf.cell(0, 5, clean_text(f"Phone: {to_phone}"), nl=True)
+    if pdf.y > BREAK_TRIGGER:
+        raise FastPathUnsupported("Billed To block overflows the first page")
+
+    pdf.l_margin = pdf.x = 10
+    pdf.y = max(pdf.y, y_before_address + 50) + 10
+
+    head = _HEAD_IGST if is_igst else _HEAD_GST
+    def draw_table_header():
+        pdf.set_font("B", 9)
+        last = len(head) - 1
+        for i, (w, label, align) in enumerate(head):
+            pdf.cell(w, 8, label, border=1, align=align, fill=True, nl=i == last)
+
+    draw_table_header()
+
+    # Table rows
+    pdf.set_font("", 9)
+    max_row_h = BREAK_TRIGGER - MARGIN - 8
+    for idx, item in enumerate(items):
+        text_w, text_lh, min_row_h = 44, 4, 8
+        product = clean_text(item['product'])
+        lines = wrap_lines(product, text_w, "", 9)
+        required_h = len(lines) * text_lh
+        row_h = max(min_row_h, required_h)
+        if row_h > max_row_h:
+            raise FastPathUnsupported("Item name taller than a page")
+
+        if pdf.will_page_break(row_h):
+            pdf.add_page()
+            draw_table_header()
+            pdf.set_font("", 9)
+
+        x0, y0 = pdf.x, pdf.y
+        pdf.cell(7, row_h, str(idx + 1), border=1, align="C")
+        line_y = y0 + (row_h - required_h) / 2
+        for line in lines:
+            if line:
+                pdf._text(line, x0 + 7, line_y, text_w, text_lh, "L")
+            line_y += text_lh
+        pdf.rect(x0 + 7, y0, text_w, row_h)
+        pdf.x = x0 + 7 + text_w
+
+        pdf.cell(15, row_h, clean_text(item.get('hsn', '')), border=1, align="C")
+        pdf.cell(11, row_h, f"{int(item.get('mrp', 0))}", border=1, align="R")
+        pdf.cell(9, row_h, f"{item['gst_percent']}%", border=1, align="C")
+        pdf.cell(14, row_h, f"{item['price']:,.2f}", border=1, align="R")
+        pdf.cell(9, row_h, str(item['qty']), border=1, align="C")
+        pdf.cell(20, row_h, f"{item['base_total']:,.2f}", border=1, align="R")
+        if is_igst:
+            pdf.cell(36, row_h, f"{item['igst']:,.2f}", border=1, align="R")
+        else:
+            pdf.cell(18, row_h, f"{item['cgst']:,.2f}", border=1, align="R")
+            pdf.cell(18, row_h, f"{item['sgst']:,.2f}", border=1, align="R")
+        pdf.cell(25, row_h, f"{item['total']:,.2f}", border=1, align="R", nl=True)
+
+    # Total row inside the table
+    if pdf.will_page_break(8):
+        pdf.add_page()
+        draw_table_header()
+    pdf.set_font("B", 9)
+    total_qty_sum = sum(item["qty"] for item in items)
+    pdf.cell(7 + 44 + 15 + 11 + 9 + 14, 8, "Total", border=1, align="R", fill=True)
+    pdf.cell(9, 8, str(total_qty_sum), border=1, align="C", fill=True)
+    pdf.cell(20, 8, f"{subtotal:,.2f}", border=1, align="R", fill=True)
+    if is_igst:
+        pdf.cell(36, 8, f"{total_igst:,.2f}", border=1, align="R", fill=True)
+    else:
+        pdf.cell(18, 8, f"{total_cgst:,.2f}", border=1, align="R", fill=True)
+        pdf.cell(18, 8, f"{total_sgst:,.2f}", border=1, align="R", fill=True)
+    pdf.cell(25, 8, f"{grand_total:,.2f}", border=1, align="R", fill=True, nl=True)
+    pdf.ln(5)
+
+    # Totals footer; these cells may still spill onto a new page
+    pdf.l_margin = pdf.x = 120
+    pdf.set_font("", 10)
+    totals = [("Subtotal:", subtotal)]
+    if not is_igst:
+        totals += [("CGST:", total_cgst), ("SGST:", total_sgst)]
+    else:
+        totals += [("IGST:", total_igst)]
+    for label, value in totals:
+        pdf.cell(30, 6, label, align="R", auto_break=True)
+        pdf.cell(40, 6, f"Rs. {value:,.2f}", align="R", nl=True, auto_break=True)
+    pdf.set_font("B", 12)
+    pdf.cell(30, 8, "Grand Total:", align="R", auto_break=True)
+    pdf.cell(40, 8, f"Rs. {grand_total:,.2f}", align="R", nl=True, auto_break=True)
+
+    pdf.l_margin = 10
+    pdf.footer()
+    return _assemble(pdf.pages, logo)
+
+
+def _assemble(pages, logo):
+    nb = str(len(pages))
+    objects = [None, None]  # 1: Pages, 2: Catalog
+    objects.append(f"<</Type /Font /Subtype /Type1 /BaseFont /{FONT_BASE['B']} /Encoding /WinAnsiEncoding>>".encode())
+    objects.append(f"<</Type /Font /Subtype /Type1 /BaseFont /{FONT_BASE['']} /Encoding /WinAnsiEncoding>>".encode())
+    xobjects = ""
+    if logo:
+        image_obj = len(objects) + 1
+        smask = ""
+        if logo["smask"] is not None:
+            objects.append(
+                f"<</Type /XObject /Subtype /Image /Width {logo['w']} /Height {logo['h']} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode "
+                f"/Length {len(logo['smask'])}>>\nstream\n".encode() + logo["smask"] + b"\nendstream"
+            )
+            smask = f" /SMask {image_obj} 0 R"
+            image_obj += 1
+        objects.append(
+            f"<</Type /XObject /Subtype /Image /Width {logo['w']} /Height {logo['h']} "
+            f"/ColorSpace {logo['colorspace']} /BitsPerComponent 8 /Filter /FlateDecode{smask} "
+            f"/Length {len(logo['data'])}>>\nstream\n".encode() + logo["data"] + b"\nendstream"
+        )
+        xobjects = f" /XObject <</I1 {image_obj} 0 R>>"
+    resources = f"<</ProcSet [/PDF /Text /ImageB /ImageC /ImageI] /Font <</F1 3 0 R /F2 4 0 R>>{xobjects}>>"
+
+    kids = []
+    for ops in pages:
+        content = "\n".join(ops).replace(NB_ALIAS, nb).encode("latin-1")
+        page_obj = len(objects) + 1
+        kids.append(f"{page_obj} 0 R")
+        objects.append(
+            f"<</Type /Page /Parent 1 0 R /Resources {resources} /Contents {page_obj + 1} 0 R>>".encode()
+        )
+        # Deflated like fpdf2's default output
+        content = zlib.compress(content)
+        objects.append(f"<</Filter /FlateDecode /Length {len(content)}>>\nstream\n".encode() + content + b"\nendstream")
+    objects[0] = f"<</Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} /MediaBox [0 0 {PAGE_W_PT} {PAGE_H_PT}]>>".encode()
+    objects[1] = b"<</Type /Catalog /Pages 1 0 R /PageLayout /OneColumn>>"
+
+    out = [b"%PDF-1.3\n%\xe9\xeb\xf1\xbf\n"]
+    offsets = []
+    pos = len(out[0])
+    for num, body in enumerate(objects, start=1):
+        chunk = b"%d 0 obj\n" % num + body + b"\nendobj\n"
+        offsets.append(pos)
+        out.append(chunk)
+        pos += len(chunk)
+    xref = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)]
+    xref.extend(b"%010d 00000 n \n" % off for off in offsets)
+    out.extend(xref)
+    out.append(b"trailer\n<</Size %d /Root 2 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, pos))
+    return b"".join(out)
+
+
+def generate_pdf_fast(invoice, logo_bytes=None):
+    """Fast path with fallback to the fpdf2 renderer for unusual invoices."""
+    try:
+        return render_fast(invoice, logo_bytes=logo_bytes)
+    except FastPathUnsupported:
+        return generate_pdf(invoice, logo_bytes=logo_bytes)
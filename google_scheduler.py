@@ -0,0 +1,200 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    # gspread goes through requests, whose errors don't subclass the builtins
+    from requests.exceptions import ConnectionError as _RequestsConnectionError, Timeout as _RequestsTimeout
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError, _RequestsConnectionError, _RequestsTimeout)
+except ImportError:
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+# Central scheduler for Google Sheets / Drive calls.
+# Every call takes a token from a per-API bucket before it goes out, waiters
+# are served in priority order, 429/5xx responses are retried with jittered
+# exponential backoff, and identical in-flight reads share a single call.
+# Writes (idempotent=False) are only retried on 429: a 5xx or timeout may
+# come back after Google applied the write, and retrying would duplicate it.
+
+# Lower value goes first
+PRIORITY_SAVE = 0        # user clicked Save
+PRIORITY_READ = 1        # a user rerun is blocked on this read
+PRIORITY_BACKGROUND = 2  # background sync / cache refresh
+
+# (requests per second, burst size). Sheets allows 60 requests/min per user.
+DEFAULT_LIMITS = {
+    "sheets": (1.0, 10),
+    "drive": (5.0, 20),
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# The request was rejected before doing anything, so any call may retry it
+REJECTED_STATUS = {429}
+
+
+class GoogleQuotaError(RuntimeError):
+    """Raised when Google keeps throttling a call after all retries."""
+
+
+def _status_of(exc):
+    # gspread.exceptions.APIError carries a requests.Response
+    resp = getattr(exc, "response", None)
+    if resp is not None and hasattr(resp, "status_code"):
+        return resp.status_code
+    # googleapiclient.errors.HttpError carries an httplib2.Response
+    resp = getattr(exc, "resp", None)
+    if resp is not None and getattr(resp, "status", None):
+        return int(resp.status)
+    return None
+
+def _is_retryable(exc, idempotent=True):
+    if not idempotent:
+        return _status_of(exc) in REJECTED_STATUS
+    if isinstance(exc, TRANSIENT_ERRORS):
+        return True
+    return _status_of(exc) in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def try_take(self):
+        # Returns 0 when a token was taken, else the seconds until one is free
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _ApiLane:
+    def __init__(self, rate, capacity):
+        self.bucket = TokenBucket(rate, capacity)
+        self.cond = threading.Condition()
+        self.waiters = []  # heap of (priority, seq)
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "throttled": 0,
+            "throttle_wait_s": 0.0,
+            "retries": 0,
+            "failures": 0,
+            "quota_errors": 0,
+        }
+
+
+class GoogleScheduler:
+    def __init__(self, limits=None, max_retries=5, base_delay=1.0, max_delay=32.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lanes = {
+            api: _ApiLane(rate, capacity)
+            for api, (rate, capacity) in (limits or DEFAULT_LIMITS).items()
+        }
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def call(self, api, fn, *args, priority=PRIORITY_READ, coalesce_key=None, idempotent=True, **kwargs):
+        """Run fn(*args, **kwargs) against the quota of `api`.
+
+        Calls sharing a `coalesce_key` while one is already running wait for
+        that call's result instead of issuing their own. Only pass a key for
+        idempotent reads. Pass idempotent=False for appends and creates so
+        they are only retried when Google rejected them with a 429.
+        """
+        lane = self._lanes[api]
+        if coalesce_key is None:
+            return self._run(lane, fn, args, kwargs, priority, idempotent)
+
+        key = (api, coalesce_key)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            with lane.cond:
+                lane.stats["coalesced"] += 1
+            return future.result()
+
+        try:
+            result = self._run(lane, fn, args, kwargs, priority, idempotent)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _run(self, lane, fn, args, kwargs, priority, idempotent=True):
+        attempt = 0
+        while True:
+            self._acquire(lane, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_retryable(e, idempotent) or attempt >= self.max_retries:
+                    with lane.cond:
+                        lane.stats["failures"] += 1
+                        if _status_of(e) == 429:
+                            lane.stats["quota_errors"] += 1
+                    if _status_of(e) == 429:
+                        raise GoogleQuotaError(
+                            "Google API quota exceeded, please try again in a minute."
+                        ) from e
+                    raise
+                # Full jitter keeps concurrent sessions from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                with lane.cond:
+                    lane.stats["retries"] += 1
+                time.sleep(delay)
+
+    def _acquire(self, lane, priority):
+        with lane.cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(lane.waiters, ticket)
+            waited = False
+            started = time.monotonic()
+            try:
+                while True:
+                    if lane.waiters[0] == ticket:
+                        wait = lane.bucket.try_take()
+                        if wait == 0:
+                            break
+                        waited = True
+                        lane.cond.wait(wait)
+                    else:
+                        waited = True
+                        lane.cond.wait()
+            finally:
+                # Leave the queue even if interrupted, then wake the next in line
+                lane.waiters.remove(ticket)
+                heapq.heapify(lane.waiters)
+                lane.cond.notify_all()
+            lane.stats["calls"] += 1
+            if waited:
+                lane.stats["throttled"] += 1
+                lane.stats["throttle_wait_s"] += time.monotonic() - started
+
+    def stats(self):
+        result = {}
+        for api, lane in self._lanes.items():
+            with lane.cond:
+                result[api] = dict(lane.stats, queued=len(lane.waiters))
+        return result
@@ -0,0 +1,567 @@
+import argparse
+import base64
+import datetime
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import invoice_core
+from invoice_pdf import generate_pdf
+from google_scheduler import GoogleScheduler, GoogleQuotaError, PRIORITY_SAVE, PRIORITY_READ
+from snapshot_cache import SnapshotCache
+
+# Local HTTP API for creating invoices without the Streamlit page.
+#
+#   POST /invoices   invoice JSON -> {"invoice_number", "drive_link", "pdf_base64", ...}
+#                    (raw PDF with X-Invoice-Number / X-Drive-Link headers when
+#                    the request sends "Accept: application/pdf")
+#   GET  /health     queue depth and Google API stats
+#
+# Items take product, hsn, mrp, qty, gst_percent, disc_percent and either
+# price (unit rate before GST) or list_price (GST-inclusive, discounted).
+#
+# Requests run on a fixed worker pool behind a bounded queue; once workers +
+# queue slots are all taken new requests get 503 with Retry-After instead of
+# piling up. Numbering, tax math, rendering and the Sheets/Drive writes are
+# the same code the Streamlit page uses.
+
+MAX_BODY_BYTES = 1 << 20
+# Per-unit amounts (price, list_price, mrp) and quantities above these are
+# typos, and large enough ones overflow the totals to inf
+MAX_AMOUNT = 1_000_000_000
+MAX_QTY = 1_000_000
+DUE_DAYS = 7
+BILLED_BY_TTL = 600
+# Re-read the last invoice number from the sheet this often, draining
+# in-flight invoices first, so numbers the Streamlit page saved in the
+# meantime are not reused
+LEDGER_RESYNC_SECONDS = 30.0
+# How many skipped invoice numbers /health remembers
+BURNED_KEEP = 100
+
+
+class InvoiceRequestError(ValueError):
+    pass
+
+
+class ServiceBusy(RuntimeError):
+    pass
+
+
+class ServiceUnavailable(RuntimeError):
+    # Seller details could not be loaded; nothing was numbered or written
+    pass
+
+
+# --- REQUEST PARSING ---
+def _number(value, field, minimum=0, maximum=None, integer=False):
+    if isinstance(value, bool):
+        raise InvoiceRequestError(f"{field} must be a number")
+    try:
+        n = float(value)
+    except (TypeError, ValueError):
+        raise InvoiceRequestError(f"{field} must be a number")
+    if not math.isfinite(n):
+        raise InvoiceRequestError(f"{field} must be a finite number")
+    if n < minimum or (maximum is not None and n > maximum):
+        bounds = f">= {minimum}" if maximum is None else f"between {minimum} and {maximum}"
+        raise InvoiceRequestError(f"{field} must be {bounds}")
+    if integer:
+        # int() would silently truncate 2.9 to 2
+        if not n.is_integer():
+            raise InvoiceRequestError(f"{field} must be a whole number")
+        return int(n)
+    return n
+
+def _reject_constant(name):
+    # json.loads accepts NaN / Infinity, which are not JSON
+    raise InvoiceRequestError(f"{name} is not valid JSON")
+
+def parse_json_body(body):
+    return json.loads(body or b"null", parse_constant=_reject_constant)
+
+def _date(value, field, default):
+    if value in (None, ""):
+        return default
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise InvoiceRequestError(f"{field} must be an ISO date (YYYY-MM-DD)")
+
+def parse_invoice_request(payload):
+    # Validates the request body and normalises it to the fields the page collects
+    if not isinstance(payload, dict):
+        raise InvoiceRequestError("body must be a JSON object")
+
+    client = payload.get("client")
+    if not isinstance(client, dict) or not str(client.get("name", "")).strip():
+        raise InvoiceRequestError("client.name is required")
+    if not str(client.get("state", "")).strip():
+        raise InvoiceRequestError("client.state is required")
+
+    raw_items = payload.get("items")
+    if not isinstance(raw_items, list) or not raw_items:
+        raise InvoiceRequestError("items must be a non-empty list")
+
+    items = []
+    for i, item in enumerate(raw_items):
+        if not isinstance(item, dict) or not str(item.get("product", "")).strip():
+            raise InvoiceRequestError(f"items[{i}].product is required")
+        gst_percent = _number(item.get("gst_percent", 18), f"items[{i}].gst_percent", maximum=100, integer=True)
+        disc_percent = _number(item.get("disc_percent", 0), f"items[{i}].disc_percent", maximum=100)
+        # Like the page: either the unit rate before GST ("price", with
+        # disc_percent only recorded alongside it), or the GST-inclusive
+        # catalog price ("list_price") that disc_percent is taken off
+        if ("price" in item) == ("list_price" in item):
+            raise InvoiceRequestError(f"items[{i}] needs exactly one of price or list_price")
+        if "list_price" in item:
+            list_price = _number(item["list_price"], f"items[{i}].list_price", maximum=MAX_AMOUNT)
+            price = invoice_core.discounted_rate(list_price, disc_percent, gst_percent)
+            mrp_default = list_price
+        else:
+            price = _number(item["price"], f"items[{i}].price", maximum=MAX_AMOUNT)
+            mrp_default = price
+        items.append({
+            "product": str(item["product"]),
+            "hsn": str(item.get("hsn", "")),
+            "mrp": _number(item.get("mrp", mrp_default), f"items[{i}].mrp", maximum=MAX_AMOUNT),
+            "disc_percent": disc_percent,
+            "gst_percent": gst_percent,
+            "qty": _number(item.get("qty", 1), f"items[{i}].qty", minimum=1, maximum=MAX_QTY, integer=True),
+            "price": price,
+        })
+
+    invoice_date = _date(payload.get("invoice_date"), "invoice_date", datetime.date.today())
+    due_date = _date(payload.get("due_date"), "due_date", invoice_date + datetime.timedelta(days=DUE_DAYS))
+    return {
+        "invoice_date": invoice_date,
+        "due_date": due_date,
+        "client": {
+            "name": str(client["name"]), "address": str(client.get("address", "")),
+            "state": str(client["state"]), "gstin": str(client.get("gstin", "")),
+            "pan": str(client.get("pan", "")), "phone": str(client.get("phone", ""))
+        },
+        "items": items,
+    }
+
+
+# --- INVOICE LEDGER ---
+class InvoiceLedger:
+    # Hands out invoice numbers and appends the Invoices rows strictly in
+    # number order. Rendering and Drive uploads run in parallel; only the
+    # final append waits for its turn, and whoever holds the turn writes every
+    # consecutive row that is ready in one append_rows call. A request that
+    # fails after taking a number gives up its turn so later invoices are not
+    # blocked. Its number is then unused, so before handing out more the
+    # ledger waits for in-flight invoices to land and re-reads the sheet: a
+    # trailing gap is reused, and numbers left stranded behind later rows are
+    # kept in `burned`. The sheet is also re-read every resync_after seconds,
+    # and each append first checks that no one else wrote past our last row.
+
+    def __init__(self, scheduler, spreadsheet, resync_after=LEDGER_RESYNC_SECONDS):
+        self.scheduler = scheduler
+        self.spreadsheet = spreadsheet
+        self.resync_after = resync_after
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._turn = 0
+        self._abandoned = set()
+        self._ready = {}
+        self._written = {}
+        self._sheet = None
+        self._synced_at = None
+        self._next_number = None
+        self._rows = 0
+        self._numbers = {}
+        self._unwritten = []
+        self._needs_sync = False
+        self.burned = deque(maxlen=BURNED_KEEP)
+
+    def _sync(self):
+        # Caller holds self._cond and nothing is in flight
+        self._sheet = self.scheduler.call("sheets", self.spreadsheet.worksheet, 'Invoices', priority=PRIORITY_SAVE)
+        values = self.scheduler.call("sheets", self._sheet.get_all_values, priority=PRIORITY_SAVE)
+        last = [dict(zip(values[0], values[-1]))] if len(values) > 1 else []
+        self._next_number = invoice_core.next_invoice_number(last)
+        # Rows including header, so len is next S.no sequence
+        self._rows = len(values)
+        self._synced_at = time.monotonic()
+
+        if self._unwritten:
+            col = values[0].index('Invoice No') if values and 'Invoice No' in values[0] else 1
+            on_sheet = {r[col] for r in values[1:] if len(r) > col}
+            for number in self._unwritten:
+                # A failed append can still have landed; numbers from the next
+                # one on get handed out again
+                if number not in on_sheet and number < self._next_number:
+                    self.burned.append(number)
+                    print(f"Invoice number {number} was skipped")
+            self._unwritten = []
+        self._needs_sync = False
+
+    def allocate(self):
+        with self._cond:
+            if self._synced_at is not None and time.monotonic() - self._synced_at >= self.resync_after:
+                # Due even under steady traffic, or invoices saved from the
+                # page would never be seen
+                self._needs_sync = True
+            # Drain in-flight invoices first; once one waiter has re-read the
+            # sheet the rest go ahead with the fresh numbers
+            while self._needs_sync and self._next_ticket != self._turn:
+                self._cond.wait()
+            if self._synced_at is None or self._needs_sync:
+                self._sync()
+            number = self._next_number
+            self._next_number = invoice_core.get_next_alpha_numeric(number)
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._numbers[ticket] = number
+            return number, ticket
+
+    def commit(self, ticket, invoice, drive_link):
+        with self._cond:
+            self._ready[ticket] = (invoice, drive_link)
+            while self._turn != ticket and ticket not in self._written:
+                self._cond.wait()
+            if ticket in self._written:
+                return self._finish(ticket)
+
+            # Our turn: take this row and every consecutive one already waiting
+            batch = []
+            t = ticket
+            while t in self._ready or t in self._abandoned:
+                if t in self._ready:
+                    batch.append(t)
+                t += 1
+            s_no = self._rows
+            next_row = self._rows + 1
+            rows = []
+            for t in batch:
+                invoice, drive_link = self._ready.pop(t)
+                rows.append(invoice_core.invoice_row(invoice, s_no, drive_link))
+                s_no += 1
+
+        # Only the turn holder gets here, so the append can run unlocked
+        error = None
+        try:
+            # The page saves to the same sheet; if it got there first these
+            # numbers may already be taken, so fail the batch and resync
+            # rather than write duplicates
+            taken = self.scheduler.call("sheets", self._sheet.row_values, next_row, priority=PRIORITY_SAVE)
+            if any(str(c).strip() for c in taken):
+                raise ServiceUnavailable("Invoices sheet changed while saving; retry to get a new number")
+            self.scheduler.call("sheets", self._sheet.append_rows, rows, priority=PRIORITY_SAVE, idempotent=False)
+        except Exception as e:
+            error = e
+        with self._cond:
+            if error is None:
+                self._rows += len(rows)
+            else:
+                self._unwritten.extend(self._numbers[t] for t in batch)
+                self._needs_sync = True
+            for t, row_data in zip(batch, rows):
+                del self._numbers[t]
+                self._written[t] = error if error is not None else row_data
+            # The batch is contiguous apart from abandoned tickets, so
+            # advancing once per row lands right after the last one
+            for _ in batch:
+                self._advance()
+            return self._finish(ticket)
+
+    def _finish(self, ticket):
+        # Caller holds self._cond
+        result = self._written.pop(ticket)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def abandon(self, ticket):
+        with self._cond:
+            self._unwritten.append(self._numbers.pop(ticket))
+            self._needs_sync = True
+            self._abandoned.add(ticket)
+            if self._turn == ticket:
+                self._advance()
+
+    def _advance(self):
+        # Caller holds self._cond
+        self._turn += 1
+        while self._turn in self._abandoned:
+            self._abandoned.discard(self._turn)
+            self._turn += 1
+        self._cond.notify_all()
+
+
+# --- SERVICE ---
+class InvoiceService:
+    def __init__(self, scheduler, spreadsheet, drive_factory, workers=4, queue_size=16, logo_bytes=None, journal_path=None):
+        self.scheduler = scheduler
+        self.spreadsheet = spreadsheet
+        self.logo_bytes = logo_bytes
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.ledger = InvoiceLedger(scheduler, spreadsheet)
+        # See invoice_core.journal_invoice; None turns the journal off
+        self.journal_path = journal_path
+        self.billed_by = SnapshotCache(self._load_billed_by, ttl=BILLED_BY_TTL)
+        self._drive_factory = drive_factory
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="invoice-worker")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.rejected = 0
+
+    def _load_billed_by(self, previous):
+        records = invoice_core.read_worksheet(self.scheduler, self.spreadsheet, 'Billed By', 'get_all_records', PRIORITY_READ)
+        return records[0] if records else (previous or {})
+
+    def _drive(self):
+        # API client objects are not thread-safe; keep one per worker
+        drive = getattr(self._local, "drive", None)
+        if drive is None:
+            drive = self._local.drive = self._drive_factory()
+        return drive
+
+    def submit(self, request):
+        # Non-blocking: a full queue is the caller's signal to back off
+        if not self._slots.acquire(blocking=False):
+            with self._pending_lock:
+                self.rejected += 1
+            raise ServiceBusy("invoice queue is full")
+        with self._pending_lock:
+            self._pending += 1
+        future = self._pool.submit(self._create_invoice, request)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _create_invoice(self, request):
+        # The seller block and the CGST/SGST vs IGST split both come from the
+        # Billed By row, so refuse rather than guess before taking a number
+        billed_by = self.billed_by.get()
+        if not billed_by:
+            raise ServiceUnavailable("Billed By sheet could not be read")
+        from_state = str(billed_by.get('State', '')).strip()
+        if not from_state:
+            raise ServiceUnavailable("Billed By sheet has no State")
+        intra_state = invoice_core.is_intra_state(from_state, request["client"]["state"])
+        items = [
+            invoice_core.compute_line_item(
+                i["product"], i["hsn"], i["mrp"], i["disc_percent"], i["gst_percent"], i["qty"], i["price"], intra_state
+            )
+            for i in request["items"]
+        ]
+        totals = [value for item in items for value in (item["base_total"], item["total"])]
+        if not all(math.isfinite(t) for t in totals + list(invoice_core.invoice_totals(items))):
+            raise InvoiceRequestError("invoice totals are too large")
+
+        invoice_number, ticket = self.ledger.allocate()
+        try:
+            invoice = {
+                "invoice_number": invoice_number,
+                "invoice_date": request["invoice_date"],
+                "due_date": request["due_date"],
+                "billed_by": billed_by,
+                "from_state": from_state,
+                "client": request["client"],
+                "items": items,
+            }
+            pdf_bytes = generate_pdf(invoice, logo_bytes=self.logo_bytes)
+            drive_link = invoice_core.upload_invoice_pdf(self.scheduler, self._drive(), invoice_number, pdf_bytes)
+        except BaseException:
+            self.ledger.abandon(ticket)
+            raise
+        row_data = self.ledger.commit(ticket, invoice, drive_link)
+        if self.journal_path:
+            self._journal(invoice)
+        return {
+            "invoice_number": invoice_number,
+            "drive_link": drive_link,
+            "grand_total": row_data[9],
+            "pdf_bytes": pdf_bytes,
+        }
+
+    def _journal(self, invoice):
+        # The invoice is already saved; a journal failure must not fail the request
+        try:
+            invoice_core.journal_invoice(invoice, self.journal_path)
+        except Exception as e:
+            print(f"Could not journal invoice {invoice['invoice_number']}: {e}")
+
+    def stats(self):
+        with self._pending_lock:
+            pending, rejected = self._pending, self.rejected
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": pending,
+            "rejected": rejected,
+            "burned_numbers": list(self.ledger.burned),
+            "google": self.scheduler.stats(),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+# --- HTTP ---
+class InvoiceRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # set by make_server
+    quiet = False
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.service.stats())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/invoices":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413 if length > 0 else 400, {"error": "invalid Content-Length"})
+            return
+
+        try:
+            request = parse_invoice_request(parse_json_body(self.rfile.read(length)))
+            future = self.service.submit(request)
+        except (json.JSONDecodeError, UnicodeDecodeError, RecursionError):
+            self._send(400, {"error": "body is not valid JSON"})
+            return
+        except InvoiceRequestError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except ServiceBusy as e:
+            self._send(503, {"error": str(e)}, headers={"Retry-After": "1"})
+            return
+
+        try:
+            result = future.result()
+        except GoogleQuotaError as e:
+            self._send(503, {"error": f"Google API rate limit: {e}"}, headers={"Retry-After": "30"})
+            return
+        except ServiceUnavailable as e:
+            self._send(503, {"error": str(e)}, headers={"Retry-After": "30"})
+            return
+        except InvoiceRequestError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        if "application/pdf" in self.headers.get("Accept", ""):
+            self._send(200, result["pdf_bytes"], "application/pdf", headers={
+                "X-Invoice-Number": result["invoice_number"],
+                "X-Drive-Link": result["drive_link"],
+            })
+        else:
+            self._send(200, {
+                "invoice_number": result["invoice_number"],
+                "drive_link": result["drive_link"],
+                "grand_total": result["grand_total"],
+                "pdf_base64": base64.b64encode(result["pdf_bytes"]).decode("ascii"),
+            })
+
+
+class InvoiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Let bursts of clients connect and be told 503 instead of being reset
+    request_queue_size = 128
+
+
+def make_server(service, host="127.0.0.1", port=8502, quiet=False):
+    handler = type("BoundInvoiceRequestHandler", (InvoiceRequestHandler,), {"service": service, "quiet": quiet})
+    return InvoiceHTTPServer((host, port), handler)
+
+
+def google_backend(fake=False, latency=0.0):
+    # -> (scheduler, spreadsheet, drive_factory)
+    if fake:
+        import fake_google
+        drive = fake_google.FakeDrive(latency)
+        return (
+            GoogleScheduler(limits=fake_google.FAKE_LIMITS),
+            fake_google.FakeSpreadsheet(latency=latency),
+            lambda: drive,
+        )
+
+    from oauth2client.service_account import ServiceAccountCredentials
+    from googleapiclient.discovery import build
+    keyfile = os.environ.get("INVOICE_API_KEYFILE")
+    if not keyfile:
+        raise SystemExit("Set INVOICE_API_KEYFILE to a service account JSON key, or pass --fake-google")
+    creds = ServiceAccountCredentials.from_json_keyfile_name(keyfile, invoice_core.GOOGLE_SCOPE)
+    scheduler = GoogleScheduler()
+    spreadsheet = invoice_core.open_spreadsheet(scheduler, creds, PRIORITY_READ)
+    return scheduler, spreadsheet, lambda: build('drive', 'v3', credentials=creds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP API for creating invoices")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=16, help="requests allowed to wait for a worker")
+    parser.add_argument("--fake-google", action="store_true", help="use the in-memory Sheets/Drive backend")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="seconds per fake Google call")
+    parser.add_argument("--no-logo", action="store_true")
+    parser.add_argument("--journal", default=invoice_core.JOURNAL_PATH,
+                        help="append saved invoices as JSON lines for einvoice.py bulk export, "
+                             "shared with the Streamlit page (default %(default)s; '' to disable)")
+    args = parser.parse_args()
+
+    logo_bytes = None
+    if not args.no_logo:
+        try:
+            logo_bytes = invoice_core.fetch_pdf_logo()
+        except Exception as e:
+            print(f"Could not fetch logo, rendering without it: {e}")
+
+    scheduler, spreadsheet, drive_factory = google_backend(args.fake_google, args.fake_latency)
+    service = InvoiceService(scheduler, spreadsheet, drive_factory, args.workers, args.queue, logo_bytes, args.journal or None)
+    server = make_server(service, args.host, args.port)
+    print(f"Invoice API listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
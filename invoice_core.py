@@ -0,0 +1,179 @@
+import io
+import os
+import threading
+import urllib.request
+import orjson
+from PIL import Image
+import gspread
+from googleapiclient.http import MediaIoBaseUpload
+from google_scheduler import PRIORITY_READ, PRIORITY_SAVE
+from invoice_pdf import PDF_LOGO_WIDTH_MM
+
+# Invoice numbering, tax math and Google Sheets / Drive persistence shared by
+# the Streamlit page (app.py) and the HTTP API (invoice_api.py).
+
+SPREADSHEET_KEY = '1msnl_ZYZTvl1j45mjPI9FvzXDphJNLsOPfhyNxanK5I'
+DRIVE_FOLDER_ID = '1lDGSAc6cyNP-nZuUZFRPmj0SDfdpLpy6'
+GOOGLE_SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+LOGO_URL = "https://lilcoo.in/wp-content/uploads/2026/02/LilCoo-Logo.png"
+
+# The logo is drawn 40mm wide on the PDF, so anything above print resolution
+# only makes every invoice stored on Drive bigger.
+PDF_LOGO_DPI = 300
+
+# Saved invoices with their line items, one JSON object per line, for the
+# bulk e-invoice export (`python einvoice.py`). The page and the API both
+# append here; the Invoices sheet only keeps totals.
+JOURNAL_PATH = os.environ.get("INVOICE_JOURNAL", "invoice_journal.jsonl")
+
+# --- INVOICE NUMBERS ---
+def get_next_alpha_numeric(current_val):
+    try:
+        letter = current_val[0]
+        num_part = int(current_val[1:])
+        num_part += 1
+        if num_part > 99999:
+            num_part = 0
+            if letter != 'Z':
+                letter = chr(ord(letter) + 1)
+        return f"{letter}{num_part:05d}"
+    except Exception:
+        return "A00001"
+
+def next_invoice_number(records):
+    # Next number after the last row of the Invoices sheet
+    if not records:
+        return "A00001"
+    last_invoice = records[-1].get('Invoice No', '')
+    if not last_invoice:
+        return "A00001"
+    return get_next_alpha_numeric(last_invoice)
+
+# --- TAX MATH ---
+def is_intra_state(from_state, to_state):
+    return from_state == "Karnataka" and to_state == "Karnataka"
+
+def compute_line_item(product, hsn, mrp, disc_percent, gst_percent, qty, price, intra_state):
+    row_total_base = price * qty
+
+    if intra_state:
+        cgst_amt = (row_total_base * (gst_percent / 2.0)) / 100.0
+        sgst_amt = (row_total_base * (gst_percent / 2.0)) / 100.0
+        igst_amt = 0
+    else:
+        cgst_amt = 0
+        sgst_amt = 0
+        igst_amt = (row_total_base * gst_percent) / 100.0
+
+    row_total_final = row_total_base + cgst_amt + sgst_amt + igst_amt
+    return {
+        "product": product,
+        "hsn": hsn,
+        "mrp": mrp,
+        "disc_percent": float(disc_percent),
+        "gst_percent": int(gst_percent),
+        "qty": qty,
+        "price": price,
+        "base_total": row_total_base,
+        "cgst": cgst_amt,
+        "sgst": sgst_amt,
+        "igst": igst_amt,
+        "total": row_total_final
+    }
+
+def discounted_rate(list_price, disc_percent, gst_percent):
+    # Unit rate before GST from a GST-inclusive catalog price and line discount
+    disc_price = list_price * ((100.0 - disc_percent) / 100.0)
+    return round(disc_price / (1.0 + (gst_percent / 100.0)), 2)
+
+def invoice_totals(items):
+    # subtotal, cgst, sgst, igst, grand total
+    return (
+        sum(item["base_total"] for item in items),
+        sum(item["cgst"] for item in items),
+        sum(item["sgst"] for item in items),
+        sum(item["igst"] for item in items),
+        sum(item["total"] for item in items),
+    )
+
+# --- LOGO ---
+def fetch_pdf_logo():
+    req = urllib.request.Request(LOGO_URL, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(req) as response:
+        img_data = response.read()
+
+    # Downsample to the print resolution of the placed size
+    img = Image.open(io.BytesIO(img_data))
+    target_w = round(PDF_LOGO_WIDTH_MM / 25.4 * PDF_LOGO_DPI)
+    if img.width > target_w:
+        target_h = max(1, round(img.height * target_w / img.width))
+        img = img.resize((target_w, target_h), Image.LANCZOS)
+    if img.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+        img = img.convert("RGBA")
+
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    optimized = out.getvalue()
+    # Keep the original if it was already smaller than our re-encode
+    return optimized if len(optimized) < len(img_data) else img_data
+
+# --- GOOGLE SHEETS / DRIVE ---
+def open_spreadsheet(scheduler, creds, priority=PRIORITY_READ):
+    client = gspread.authorize(creds)
+    return scheduler.call("sheets", client.open_by_key, SPREADSHEET_KEY, priority=priority)
+
+def read_worksheet(scheduler, spreadsheet, name, method, priority=PRIORITY_READ):
+    # Identical reads from concurrent sessions are coalesced into one call
+    worksheet = scheduler.call(
+        "sheets", spreadsheet.worksheet, name,
+        priority=priority, coalesce_key=("worksheet", name)
+    )
+    return scheduler.call(
+        "sheets", getattr(worksheet, method),
+        priority=priority, coalesce_key=(method, name)
+    )
+
+def upload_invoice_pdf(scheduler, drive_service, invoice_number, pdf_bytes):
+    file_metadata = {
+        'name': f"{invoice_number}.pdf",
+        'parents': [DRIVE_FOLDER_ID]
+    }
+    media = MediaIoBaseUpload(io.BytesIO(pdf_bytes), mimetype='application/pdf')
+    create_request = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+    drive_file = scheduler.call("drive", create_request.execute, priority=PRIORITY_SAVE, idempotent=False)
+    return drive_file.get('webViewLink', '')
+
+def invoice_row(invoice, s_no, drive_link):
+    # S.No, Invoice No, Date, Due Date, Client Name, Subtotal, CGST, SGST, IGST, Grand Total, Drive Link
+    subtotal, total_cgst, total_sgst, total_igst, grand_total = invoice_totals(invoice["items"])
+    return [
+        s_no,
+        invoice["invoice_number"],
+        invoice["invoice_date"].strftime('%Y-%m-%d'),
+        invoice["due_date"].strftime('%Y-%m-%d'),
+        invoice["client"]["name"],
+        float(round(subtotal, 2)),
+        float(round(total_cgst, 2)),
+        float(round(total_sgst, 2)),
+        float(round(total_igst, 2)),
+        float(round(grand_total, 2)),
+        drive_link
+    ]
+
+_journal_lock = threading.Lock()
+
+def journal_invoice(invoice, path=JOURNAL_PATH):
+    # One write per line in append mode, so the page and the API processes
+    # can share the file
+    line = orjson.dumps(invoice, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+    with _journal_lock, open(path, "ab") as f:
+        f.write(line)
+
+def append_invoice_row(scheduler, spreadsheet, invoice, drive_link):
+    invoices_sheet = scheduler.call("sheets", spreadsheet.worksheet, 'Invoices', priority=PRIORITY_SAVE)
+
+    # Rows including header, so len is next S.no sequence
+    s_no = len(scheduler.call("sheets", invoices_sheet.get_all_values, priority=PRIORITY_SAVE))
+    row_data = invoice_row(invoice, s_no, drive_link)
+    scheduler.call("sheets", invoices_sheet.append_row, row_data, priority=PRIORITY_SAVE, idempotent=False)
+    return row_data
@@ -0,0 +1,299 @@
+import io
+from fpdf import FPDF
+
+# Invoice PDF rendering with fpdf2, shared by the Streamlit page and batch jobs.
+
+PDF_LOGO_WIDTH_MM = 40
+
+# Helper to strip unsupported unicode characters before sending to fpdf2
+def clean_text(t):
+    if t is None: return ""
+    t = str(t)
+    # Specific character replacements
+    t = t.replace('\u20b9', 'Rs.').replace('\u2018', "'").replace('\u2019', "'")
+    t = t.replace('\u201c', '"').replace('\u201d', '"').replace('\u2013', '-')
+    t = t.replace('\u2014', '-').replace('\u00a0', ' ').replace('\u200b', '')
+
+    # Strip bidirectional/isolate formatting characters that Helvetica doesn't support
+    for char in ['\u2066', '\u2067', '\u2068', '\u2069', '\u200e', '\u200f', '\u202a', '\u202b', '\u202c', '\u202d', '\u202e']:
+        t = t.replace(char, '')
+
+    return t.encode('latin-1', 'replace').decode('latin-1')
+
+
+# We need a custom class to handle multi-page headers and footers properly
+class InvoicePDF(FPDF):
+    def __init__(self, inv_no, inv_date, billed_to_name):
+        super().__init__()
+        self.inv_no = inv_no
+        self.inv_date = inv_date
+        self.billed_to_name = billed_to_name
+
+    def footer(self):
+        # Go to 35 mm from bottom
+        self.set_y(-35)
+
+        # Separator Line First (The "Page Break" line)
+        self.line(self.get_x(), self.get_y(), 210 - self.get_x(), self.get_y())
+        self.ln(2)
+
+        # --- Page Breaker Info ---
+        # Left side: Invoice No and Date
+        # Right side: Billed To
+        self.set_font("helvetica", "B", 9)
+        self.cell(40, 4, "Invoice No", border=0, new_x="RIGHT", new_y="TOP")
+        self.cell(40, 4, "Invoice Date", border=0, new_x="RIGHT", new_y="TOP")
+        self.cell(0, 4, "Billed To", border=0, new_x="LMARGIN", new_y="NEXT")
+
+        self.set_font("helvetica", "", 9)
+        self.cell(40, 4, clean_text(self.inv_no), border=0, new_x="RIGHT", new_y="TOP")
+        self.cell(40, 4, self.inv_date.strftime('%d %b %Y'), border=0, new_x="RIGHT", new_y="TOP")
+        self.cell(0, 4, clean_text(self.billed_to_name) if self.billed_to_name else "Client Name", border=0, new_x="LMARGIN", new_y="NEXT")
+
+        self.ln(5)
+
+        # --- Page Number & Disclaimer ---
+        self.set_font("helvetica", "B", 9)
+        self.cell(0, 6, f"Page {self.page_no()} of {{nb}}", align="L", new_x="LMARGIN", new_y="NEXT")
+
+        self.set_font("helvetica", "", 8)
+        self.set_text_color(128, 128, 128)
+        self.cell(0, 4, "This is an electronically generated document, no signature is required.", align="L", new_x="LMARGIN", new_y="NEXT")
+        self.set_text_color(0, 0, 0)
+
+
+def generate_pdf(invoice, logo_bytes=None):
+    """Render an invoice to PDF bytes.
+
+    `invoice` holds invoice_number, invoice_date, due_date, billed_by (the
+    'Billed By' sheet row), from_state, client (name/address/state/gstin/pan/
+    phone) and items (rows with product, hsn, mrp, gst_percent, price, qty,
+    base_total, cgst, sgst, igst and total).
+    """
+    invoice_number = invoice["invoice_number"]
+    invoice_date = invoice["invoice_date"]
+    due_date = invoice["due_date"]
+    billed_by = invoice["billed_by"]
+    from_state = invoice["from_state"]
+    client = invoice["client"]
+    to_name, to_address, to_state = client["name"], client["address"], client["state"]
+    to_gstin, to_pan, to_phone = client["gstin"], client["pan"], client["phone"]
+    invoice_items = invoice["items"]
+
+    subtotal = sum(item["base_total"] for item in invoice_items)
+    total_cgst = sum(item["cgst"] for item in invoice_items)
+    total_sgst = sum(item["sgst"] for item in invoice_items)
+    total_igst = sum(item["igst"] for item in invoice_items)
+    grand_total = sum(item["total"] for item in invoice_items)
+
+    pdf = InvoicePDF(invoice_number, invoice_date, to_name)
+    pdf.alias_nb_pages() # Required for {nb} to be replaced with total pages
+
+    # VERY IMPORTANT: Set the auto page break high enough so the table 
+    # stops drawing BEFORE it crashes into our custom 45mm tall footer.
+    pdf.set_auto_page_break(auto=True, margin=50) 
+
+    pdf.add_page()
+
+    # Logo on the Top Right
+    if logo_bytes:
+        try:
+            # fpdf2 keys images by an md5 of their bytes, so reusing the same
+            # cached bytes guarantees a single embedded copy per document.
+            # Place logo on the top right. Page width is ~210mm.
+            pdf.image(io.BytesIO(logo_bytes), x=155, y=10, w=PDF_LOGO_WIDTH_MM)
+        except Exception:
+            pass 
+
+    # Top Header - Left: Invoice Details
+    pdf.set_font("helvetica", "B", 24)
+    pdf.set_y(15)
+    pdf.cell(100, 10, "INVOICE", new_x="LMARGIN", new_y="NEXT", align="L")
+    pdf.ln(5)
+
+    pdf.set_font("helvetica", "B", 10)
+    pdf.cell(35, 6, "Invoice Number:", new_x="RIGHT", new_y="TOP")
+    pdf.set_font("helvetica", "", 10)
+    pdf.cell(65, 6, clean_text(invoice_number), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "B", 10)
+    pdf.cell(35, 6, "Invoice Date:", new_x="RIGHT", new_y="TOP")
+    pdf.set_font("helvetica", "", 10)
+    pdf.cell(65, 6, f"{invoice_date.strftime('%d %b %Y')}", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "B", 10)
+    pdf.cell(35, 6, "Due Date:", new_x="RIGHT", new_y="TOP")
+    pdf.set_font("helvetica", "", 10)
+    pdf.cell(65, 6, f"{due_date.strftime('%d %b %Y')}", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.ln(15)
+
+    # Billed By (Left Side)
+    y_before_address = pdf.get_y()
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(100, 6, "Billed By", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "B", 10)
+    if billed_by.get('Company Name'):
+        pdf.cell(100, 5, clean_text(billed_by.get('Company Name', '')), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "", 10)
+    if billed_by.get('Address Line 1'):
+        pdf.cell(100, 5, clean_text(billed_by.get('Address Line 1', '')), new_x="LMARGIN", new_y="NEXT")
+    if billed_by.get('Address Line 2'):
+        pdf.cell(100, 5, clean_text(billed_by.get('Address Line 2', '')), new_x="LMARGIN", new_y="NEXT")
+    if billed_by.get('GSTIN'):
+        pdf.cell(100, 5, clean_text(f"GSTIN: {billed_by.get('GSTIN', '')}"), new_x="LMARGIN", new_y="NEXT")
+    if billed_by.get('PAN'):
+        pdf.cell(100, 5, clean_text(f"PAN: {billed_by.get('PAN', '')}"), new_x="LMARGIN", new_y="NEXT")
+    if billed_by.get('Phone'):
+        pdf.cell(100, 5, clean_text(f"Phone: {billed_by.get('Phone', '')}"), new_x="LMARGIN", new_y="NEXT")
+
+    # Billed To (Right Side)
+    # Move up and set right margin for 2-column layout
+    pdf.set_y(y_before_address)
+    pdf.set_left_margin(115)
+
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(0, 6, "Billed To", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "B", 10)
+    if to_name:
+        pdf.cell(0, 5, clean_text(to_name), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_font("helvetica", "", 10)
+    for line in to_address.split('\n'):
+        if line.strip():
+            pdf.cell(0, 5, clean_text(line.strip()), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.cell(0, 5, clean_text(f"State: {to_state}"), new_x="LMARGIN", new_y="NEXT")
+    if to_gstin:
+        pdf.cell(0, 5, clean_text(f"GSTIN: {to_gstin}"), new_x="LMARGIN", new_y="NEXT")
+    if to_pan:
+        pdf.cell(0, 5, clean_text(f"PAN: {to_pan}"), new_x="LMARGIN", new_y="NEXT")
+    if to_phone and str(to_phone).strip() != "":
+        pdf.cell(0, 5, clean_text(f"Phone: {to_phone}"), new_x="LMARGIN", new_y="NEXT")
+
+    # Reset Margin for Table
+    # Make Y coord lower than both columns
+    pdf.set_left_margin(10)
+    pdf.set_y(max(pdf.get_y(), y_before_address + 50) + 10)
+
+    # Table Header Function
+    def draw_table_header():
+        pdf.set_font("helvetica", "B", 9)
+        pdf.set_fill_color(240, 240, 240)
+
+        # Widths: S.No=7, Item=44, HSN=15, MRP=11, Disc=8, GST=9, Rate=14, Qty=9, BaseAmt=20, CGST=18, SGST=18, IGST=36, Total=25/7
+        # Total Width 190.
+        pdf.cell(7, 8, "", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
+        pdf.cell(44, 8, "Item", border=1, new_x="RIGHT", new_y="TOP", fill=True)
+        pdf.cell(15, 8, "HSN", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
+        pdf.cell(11, 8, "MRP", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+        pdf.cell(9, 8, "GST%", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
+        pdf.cell(14, 8, "Rate", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+        pdf.cell(9, 8, "Qty", border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
+        pdf.cell(20, 8, "Amount", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+
+        if is_igst:
+            pdf.cell(36, 8, "IGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+            pdf.cell(25, 8, "Total", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
+        else:
+            pdf.cell(18, 8, "CGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+            pdf.cell(18, 8, "SGST", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+            pdf.cell(25, 8, "Total", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
+
+    is_igst = from_state != to_state
+    draw_table_header()
+
+    # Table Rows
+    pdf.set_font("helvetica", "", 9)
+    for idx1, item1 in enumerate(invoice_items):
+        text_w = 44 # Item column width
+        text_lh = 4 # Less space between lines
+        min_row_h = 8
+
+        # Use multi_cell with dry_run to calculate lines instead of deprecated split_only
+        lines = pdf.multi_cell(text_w, text_lh, clean_text(item1['product']), border=0, align="L", dry_run=True, output="LINES")
+        required_h = len(lines) * text_lh
+        row_h = max(min_row_h, required_h)
+
+        if pdf.will_page_break(row_h):
+            pdf.add_page()
+            draw_table_header()
+            pdf.set_font("helvetica", "", 9)
+
+        # Draw cells
+        curr_x1 = pdf.get_x()
+        curr_y1 = pdf.get_y()
+
+        # S.No
+        pdf.cell(7, row_h, str(idx1 + 1), border=1, new_x="RIGHT", new_y="TOP", align="C")
+
+        # Item Name (Multi-line) centered vertically
+        y_offset = (row_h - required_h) / 2
+        pdf.set_xy(curr_x1 + 7, curr_y1 + y_offset)
+        pdf.multi_cell(text_w, text_lh, clean_text(item1['product']), border=0, align="L", new_x="RIGHT", new_y="TOP")
+        pdf.rect(curr_x1 + 7, curr_y1, text_w, row_h)
+        pdf.set_xy(curr_x1 + 7 + text_w, curr_y1)
+
+        # Other columns
+        pdf.cell(15, row_h, clean_text(item1.get('hsn', '')), border=1, new_x="RIGHT", new_y="TOP", align="C")
+        pdf.cell(11, row_h, f"{int(item1.get('mrp', 0))}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+        pdf.cell(9, row_h, f"{item1['gst_percent']}%", border=1, new_x="RIGHT", new_y="TOP", align="C")
+        pdf.cell(14, row_h, f"{item1['price']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+        pdf.cell(9, row_h, str(item1['qty']), border=1, new_x="RIGHT", new_y="TOP", align="C")
+        pdf.cell(20, row_h, f"{item1['base_total']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+
+        if is_igst:
+            pdf.cell(36, row_h, f"{item1['igst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+            pdf.cell(25, row_h, f"{item1['total']:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R")
+        else:
+            pdf.cell(18, row_h, f"{item1['cgst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+            pdf.cell(18, row_h, f"{item1['sgst']:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R")
+            pdf.cell(25, row_h, f"{item1['total']:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R")
+
+    # Total Row inside the table
+    if pdf.will_page_break(8):
+        pdf.add_page()
+        draw_table_header()
+
+    pdf.set_font("helvetica", "B", 9)
+    pdf.set_fill_color(240, 240, 240)
+
+    total_qty_sum = sum(item["qty"] for item in invoice_items)
+    pdf.cell(7 + 44 + 15 + 11 + 9 + 14, 8, "Total", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+    pdf.cell(9, 8, str(total_qty_sum), border=1, new_x="RIGHT", new_y="TOP", align="C", fill=True)
+    pdf.cell(20, 8, f"{subtotal:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+
+    if is_igst:
+        pdf.cell(36, 8, f"{total_igst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+        pdf.cell(25, 8, f"{grand_total:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
+    else:
+        pdf.cell(18, 8, f"{total_cgst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+        pdf.cell(18, 8, f"{total_sgst:,.2f}", border=1, new_x="RIGHT", new_y="TOP", align="R", fill=True)
+        pdf.cell(25, 8, f"{grand_total:,.2f}", border=1, new_x="LMARGIN", new_y="NEXT", align="R", fill=True)
+
+    pdf.ln(5)
+
+    # Totals Footer
+    pdf.set_left_margin(120)
+    pdf.set_font("helvetica", "", 10)
+    pdf.cell(30, 6, "Subtotal:", new_x="RIGHT", new_y="TOP", align="R")
+    pdf.cell(40, 6, f"Rs. {subtotal:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
+
+    if not is_igst:
+        pdf.cell(30, 6, "CGST:", new_x="RIGHT", new_y="TOP", align="R")
+        pdf.cell(40, 6, f"Rs. {total_cgst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
+        pdf.cell(30, 6, "SGST:", new_x="RIGHT", new_y="TOP", align="R")
+        pdf.cell(40, 6, f"Rs. {total_sgst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
+    else:
+        pdf.cell(30, 6, "IGST:", new_x="RIGHT", new_y="TOP", align="R")
+        pdf.cell(40, 6, f"Rs. {total_igst:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
+
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(30, 8, "Grand Total:", new_x="RIGHT", new_y="TOP", align="R")
+    pdf.cell(40, 8, f"Rs. {grand_total:,.2f}", new_x="LMARGIN", new_y="NEXT", align="R")
+
+    pdf.set_left_margin(10)
+    return bytes(pdf.output())
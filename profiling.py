@@ -0,0 +1,194 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Opt-in sampling profiler for Streamlit reruns and saves.
+# A background thread samples the profiled thread's stack every few ms, so the
+# page runs at normal speed and the samples double as flamegraph input. Each
+# finished profile is written to a small ring buffer of JSON files on disk.
+
+PROFILE_ENV = "INVOICE_PROFILE"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_DIR = os.environ.get("INVOICE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "invoice-profiles"))
+PROFILE_KEEP_ENV = "INVOICE_PROFILE_KEEP"
+DEFAULT_PROFILE_KEEP = 20
+SAMPLE_INTERVAL = 0.005
+# A sampler whose stop() never comes (an abandoned session, a rerun cut
+# short) ends on its own after this long
+MAX_PROFILE_SECONDS = 60.0
+
+_TRUTHY = ("1", "true", "yes", "on")
+
+
+def profiling_enabled(query_params=None):
+    if os.environ.get(PROFILE_ENV, "").strip().lower() in _TRUTHY:
+        return True
+    if query_params is not None:
+        return str(query_params.get(PROFILE_QUERY_PARAM, "")).strip().lower() in _TRUTHY
+    return False
+
+
+# --- SAMPLER ---
+def _frame_label(frame):
+    code = frame.f_code
+    # Top-level script code is one long <module> frame; the current line is
+    # what tells the item loop apart from the summary or the save block
+    line = frame.f_lineno if code.co_name == "<module>" else code.co_firstlineno
+    # ';' separates frames in the folded format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})".replace(";", ",")
+
+
+class StackSampler:
+    def __init__(self, label, root_file=None, interval=SAMPLE_INTERVAL, max_seconds=MAX_PROFILE_SECONDS):
+        # root_file trims everything above its outermost frame (the
+        # Streamlit script runner, for example)
+        self.label = label
+        self.root_file = os.path.abspath(root_file) if root_file else None
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.truncated = False
+        self.stacks = Counter()
+        self._root_paths = {}
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._started_wall = None
+        self._ended = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._started_wall = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.label}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        # -> profile dict, see ProfileRing
+        self._stop.set()
+        self._thread.join()
+        return {
+            "label": self.label,
+            "started": self._started_wall,
+            "wall_s": self._ended - self._started,
+            "truncated": self.truncated,
+            "interval_s": self.interval,
+            "samples": sum(self.stacks.values()),
+            "stacks": dict(self.stacks),
+        }
+
+    def _run(self):
+        deadline = self._started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() >= deadline:
+                self.truncated = True
+                break
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+        self._ended = min(time.perf_counter(), deadline)
+
+    def _is_root(self, filename):
+        is_root = self._root_paths.get(filename)
+        if is_root is None:
+            is_root = self._root_paths[filename] = os.path.abspath(filename) == self.root_file
+        return is_root
+
+    def _fold(self, frame):
+        frames = []
+        root = None
+        while frame is not None:
+            frames.append(frame)
+            if self.root_file and self._is_root(frame.f_code.co_filename):
+                root = len(frames)
+            frame = frame.f_back
+        if root is not None:
+            frames = frames[:root]
+        return ";".join(_frame_label(f) for f in reversed(frames))
+
+
+# --- RING BUFFER ---
+def _keep_from_env():
+    try:
+        return max(1, int(os.environ.get(PROFILE_KEEP_ENV, DEFAULT_PROFILE_KEEP)))
+    except ValueError:
+        return DEFAULT_PROFILE_KEEP
+
+
+class ProfileRing:
+    # The newest `keep` profiles as <time_ns>-<label>.json files; keep
+    # defaults to $INVOICE_PROFILE_KEEP
+    def __init__(self, directory=PROFILE_DIR, keep=None):
+        self.directory = directory
+        self.keep = keep if keep is not None else _keep_from_env()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, profile):
+        name = f"{time.time_ns():020d}-{profile['label']}.json"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(profile, f)
+            os.replace(path + ".tmp", path)
+            for old in self.list()[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except OSError:
+                    pass
+        return name
+
+    def list(self):
+        # Newest first
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted((n for n in names if n.endswith(".json")), reverse=True)
+
+    def load(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return json.load(f)
+
+
+# --- REPORTS ---
+def profile_title(name):
+    # "<time_ns>-<label>.json" -> "label @ HH:MM:SS"
+    stamp, label = name[:-len(".json")].split("-", 1)
+    return f"{label} @ {time.strftime('%H:%M:%S', time.localtime(int(stamp) / 1e9))}"
+
+
+def hot_functions(profile, limit=20):
+    # Self time = samples where the function was running; total time also
+    # counts samples where it was further up the stack
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in profile["stacks"].items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for label in set(frames):
+            total_counts[label] += count
+
+    samples = profile["samples"] or 1
+    rows = []
+    for label, self_n in self_counts.most_common(limit):
+        rows.append({
+            "function": label,
+            "self_ms": round(self_n / samples * profile["wall_s"] * 1000, 1),
+            "self_%": round(self_n / samples * 100, 1),
+            "total_ms": round(total_counts[label] / samples * profile["wall_s"] * 1000, 1),
+            "total_%": round(total_counts[label] / samples * 100, 1),
+        })
+    return rows
+
+
+def folded(profile):
+    # Brendan Gregg's collapsed-stack format, for flamegraph.pl / speedscope
+    return "\n".join(
+        f"{stack} {count}"
+        for stack, count in sorted(profile["stacks"].items(), key=lambda kv: -kv[1])
+    ) + "\n"
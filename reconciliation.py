@@ -0,0 +1,342 @@
+import csv
+import io
+import re
+import math
+import bisect
+import datetime
+import functools
+import itertools
+
+# Bank-statement payment reconciliation against the Invoices sheet.
+# Each credit is matched through indexes rather than pairwise comparison:
+#   1. invoice number found in the narration (hash lookup)
+#   2. amount within a tolerance window (bisect on invoices sorted by total),
+#      narrowed by client name tokens found in the narration (token -> clients)
+#   3. client name alone, settling that client's oldest open invoices
+# Amounts and refs already in the result columns carry over, so reconciling
+# one month's statement keeps earlier payments and skips credits seen before.
+
+STATUS_MATCHED = "Matched"
+STATUS_PARTIAL = "Partial"
+STATUS_UNMATCHED = "Unmatched"
+
+# Columns written back next to the existing Invoices columns
+RESULT_HEADERS = ["Payment Status", "Amount Received", "Payment Date", "Payment Ref"]
+
+INVOICE_NO_RE = re.compile(r"\b([A-Z][0-9]{5})\b")
+TOKEN_RE = re.compile(r"[A-Z0-9]+")
+NAME_STOPWORDS = {
+    "PVT", "PRIVATE", "LTD", "LIMITED", "LLP", "CO", "COMPANY", "AND", "THE",
+    "MS", "INDIA", "ENTERPRISES", "TRADERS", "INC", "CORP",
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%m-%y", "%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%d.%m.%Y"]
+
+# Header cells are compared after _header_key(), so "Deposit Amt." (HDFC),
+# "Deposit Amount (INR )" (ICICI) and "Ref No./Cheque No." (SBI) all match
+DATE_HEADERS = {"date", "txn date", "transaction date", "value date", "value dt", "tran date", "posting date", "txn posted date"}
+NARRATION_HEADERS = {"narration", "description", "particulars", "remarks", "transaction remarks", "details", "transaction details"}
+CREDIT_HEADERS = {"credit", "deposit", "deposits", "credit amount", "deposit amt", "deposit amount", "cr", "amount cr", "credit amt", "deposit cr"}
+AMOUNT_HEADERS = {"amount", "transaction amount", "amt", "txn amount"}
+DRCR_HEADERS = {"dr cr", "cr dr", "type", "debit credit", "txn type"}
+REF_HEADERS = {"ref no", "reference", "ref no cheque no", "chq ref number", "chq ref no", "cheque no", "cheque number",
+               "chqno", "utr", "utr no", "reference no", "ref"}
+HEADER_CURRENCY = {"inr", "rs", "in"}
+HEADER_PUNCT_RE = re.compile(r"[^a-z0-9]+")
+
+def parse_date(value):
+    return _parse_date_text(str(value or "").strip())
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_text(value):
+    # Statements repeat the same few hundred dates; strptime is the slow part
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_amount(value):
+    text = str(value or "").replace(",", "").replace("₹", "").replace("INR", "").strip()
+    if text.endswith(("CR", "Cr", "cr")):
+        text = text[:-2].strip()
+    try:
+        return round(float(text), 2) if text else 0.0
+    except ValueError:
+        return 0.0
+
+def name_tokens(name):
+    return {t for t in TOKEN_RE.findall(str(name or "").upper()) if len(t) >= 3 and t not in NAME_STOPWORDS}
+
+
+def _header_key(cell):
+    # Lowercase words without punctuation or a trailing currency such as "(INR )"
+    words = HEADER_PUNCT_RE.sub(" ", str(cell).lower()).split()
+    while len(words) > 1 and words[-1] in HEADER_CURRENCY:
+        words.pop()
+    return " ".join(words)
+
+def _find_header(rows):
+    # Statements often start with account details; find the real header row
+    for i, row in enumerate(rows):
+        lowered = [_header_key(c) for c in row]
+        if any(c in DATE_HEADERS for c in lowered) and any(c in NARRATION_HEADERS for c in lowered):
+            return i, lowered
+    raise ValueError("Could not find a Date / Narration header row in the bank statement.")
+
+def _col(header, names):
+    for i, c in enumerate(header):
+        if c in names:
+            return i
+    return None
+
+def parse_bank_statement(data, source=""):
+    """Parse a bank statement CSV (bytes or str) into a list of credit transactions."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    rows = list(csv.reader(io.StringIO(data)))
+    start, header = _find_header(rows)
+
+    date_i = _col(header, DATE_HEADERS)
+    narr_i = _col(header, NARRATION_HEADERS)
+    credit_i = _col(header, CREDIT_HEADERS)
+    amount_i = _col(header, AMOUNT_HEADERS)
+    drcr_i = _col(header, DRCR_HEADERS)
+    ref_i = _col(header, REF_HEADERS)
+    if credit_i is None and amount_i is None:
+        raise ValueError("Could not find a Credit / Deposit / Amount column in the bank statement.")
+
+    txns = []
+    for line_no, row in enumerate(rows[start + 1:], start=start + 2):
+        if len(row) <= max(date_i, narr_i):
+            continue
+        txn_date = parse_date(row[date_i])
+        if txn_date is None:
+            continue
+        if credit_i is not None:
+            amount = parse_amount(row[credit_i]) if credit_i < len(row) else 0.0
+        else:
+            amount = parse_amount(row[amount_i]) if amount_i < len(row) else 0.0
+            if drcr_i is not None and drcr_i < len(row) and not row[drcr_i].strip().upper().startswith("C"):
+                amount = 0.0
+        if amount <= 0:
+            continue  # Only incoming payments can settle invoices
+        txns.append({
+            "date": txn_date,
+            "narration": row[narr_i].strip(),
+            "amount": amount,
+            "ref": row[ref_i].strip() if ref_i is not None and ref_i < len(row) else "",
+            "source": f"{source}:{line_no}" if source else str(line_no),
+        })
+    return txns
+
+
+def invoices_from_sheet(values):
+    """Turn Invoices worksheet values (header row first) into invoice dicts."""
+    if not values:
+        return []
+    header = values[0]
+    col = {name: i for i, name in enumerate(header)}
+    def cell(row, name):
+        i = col.get(name)
+        return row[i] if i is not None and i < len(row) else ""
+
+    invoices = []
+    for row_no, row in enumerate(values[1:], start=2):
+        invoice_no = str(cell(row, "Invoice No")).strip()
+        if not invoice_no:
+            continue
+        prior = [str(cell(row, name)).strip() for name in RESULT_HEADERS]
+        invoices.append({
+            "row": row_no,
+            "invoice_no": invoice_no,
+            "date": parse_date(cell(row, "Date")),
+            "client": str(cell(row, "Client Name")),
+            "total": parse_amount(cell(row, "Grand Total")),
+            # Result columns from an earlier run, empty if never reconciled
+            "prior": {
+                "status": prior[0],
+                "received": parse_amount(prior[1]),
+                "payment_date": prior[2],
+                "refs": prior[3],
+            } if any(prior) else None,
+        })
+    return invoices
+
+def _prior_refs(invoice):
+    prior = invoice.get("prior")
+    if not prior or not prior["refs"]:
+        return []
+    return [r.strip() for r in prior["refs"].split(",") if r.strip()]
+
+
+def reconcile(invoices, txns, amount_tolerance=1.0):
+    """Match bank credits to invoices.
+
+    Returns (results, unmatched_txns). results maps invoice_no to a dict with
+    status, received, payment_date and refs. Amounts already recorded on an
+    invoice (its "prior" result columns) count towards it, and credits whose
+    ref is already recorded are skipped. Invoices that never received a
+    credit are reported as Unmatched.
+    """
+    by_number = {inv["invoice_no"].upper(): inv for inv in invoices}
+
+    # Client names are matched as a whole, with rare tokens counting for more
+    # than ones many clients share (STORES, AGENCIES...)
+    client_ids = {}
+    client_invoices = []
+    client_of = {}
+    for inv in invoices:
+        cid = client_ids.setdefault(inv["client"].strip().upper(), len(client_invoices))
+        if cid == len(client_invoices):
+            client_invoices.append([])
+        client_invoices[cid].append(inv)
+        client_of[id(inv)] = cid
+    client_tokens = [name_tokens(invs[0]["client"]) for invs in client_invoices]
+    by_token = {}
+    for cid, tokens in enumerate(client_tokens):
+        for token in tokens:
+            by_token.setdefault(token, set()).add(cid)
+    weight = {t: math.log((1 + len(client_tokens)) / len(cids)) for t, cids in by_token.items()}
+    client_weight = [sum(weight[t] for t in tokens) for tokens in client_tokens]
+    client_unique = [{t for t in tokens if len(by_token[t]) == 1} for tokens in client_tokens]
+
+    by_amount = sorted(invoices, key=lambda inv: inv["total"])
+    amounts = [inv["total"] for inv in by_amount]
+
+    received = {inv["invoice_no"]: inv["prior"]["received"] if inv.get("prior") else 0.0 for inv in invoices}
+    payments = {inv["invoice_no"]: [] for inv in invoices}
+    seen_refs = {ref for inv in invoices for ref in _prior_refs(inv)}
+
+    def outstanding(inv):
+        return inv["total"] - received[inv["invoice_no"]]
+
+    def is_open(inv, txn_date):
+        return outstanding(inv) > amount_tolerance and (inv["date"] is None or inv["date"] <= txn_date)
+
+    def named_clients(tokens):
+        # A client is named when every token unique to it is in the narration,
+        # or when at least two of its tokens carrying most of its weight are.
+        # Candidates are clients owning a unique token or a pair of the
+        # narration's tokens, so common tokens never fan out on their own.
+        present = [t for t in tokens if t in by_token]
+        candidates = set()
+        for t in present:
+            if len(by_token[t]) == 1:
+                candidates |= by_token[t]
+        for a, b in itertools.combinations(present, 2):
+            candidates |= by_token[a] & by_token[b]
+
+        named = []
+        exact = []
+        for cid in candidates:
+            own = client_tokens[cid]
+            found = own & tokens
+            if found == own:
+                exact.append(cid)
+                continue
+            distinctive = client_unique[cid]
+            if distinctive and distinctive <= found:
+                named.append(cid)
+            elif len(found) >= 2 and sum(weight[t] for t in found) * 2 > client_weight[cid]:
+                named.append(cid)
+        # A client spelled out in full beats ones only partly mentioned
+        return exact or named
+
+    def oldest_first(invs):
+        return sorted(invs, key=lambda inv: inv["date"] or datetime.date.min)
+
+    unmatched = []
+    for txn in sorted(txns, key=lambda t: t["date"]):
+        if (txn["ref"] or txn["source"]) in seen_refs:
+            continue  # Recorded by an earlier run, or repeated in an overlapping statement
+        if txn["ref"]:
+            seen_refs.add(txn["ref"])
+        narration = txn["narration"].upper()
+        amount = txn["amount"]
+        targets = []
+
+        # 1. Invoice numbers quoted in the narration
+        for number in INVOICE_NO_RE.findall(narration):
+            inv = by_number.get(number)
+            if inv is not None and inv not in targets:
+                targets.append(inv)
+
+        if not targets:
+            clients = set(named_clients(set(TOKEN_RE.findall(narration))))
+
+            # 2. Amount window, preferring the client named in the narration
+            lo = bisect.bisect_left(amounts, amount - amount_tolerance)
+            hi = bisect.bisect_right(amounts, amount + amount_tolerance)
+            by_amt = [inv for inv in by_amount[lo:hi] if is_open(inv, txn["date"])]
+            both = [inv for inv in by_amt if client_of[id(inv)] in clients]
+            named = []
+            if not both and len(clients) == 1:
+                named = [inv for inv in client_invoices[next(iter(clients))] if is_open(inv, txn["date"])]
+            if both:
+                targets = oldest_first(both)[:1]
+            elif named:
+                # One client named but amount differs: settle its oldest open invoices first
+                targets = oldest_first(named)
+            elif not clients and len(by_amt) == 1:
+                # Anonymous credit: only trust an unambiguous amount match
+                targets = by_amt
+
+        if not targets:
+            unmatched.append(txn)
+            continue
+
+        remaining = amount
+        for i, inv in enumerate(targets):
+            share = remaining if i == len(targets) - 1 else min(remaining, max(outstanding(inv), 0.0))
+            if share <= 0:
+                break
+            received[inv["invoice_no"]] += share
+            payments[inv["invoice_no"]].append(txn)
+            remaining -= share
+
+    results = {}
+    for inv in invoices:
+        prior = inv.get("prior")
+        txs = payments[inv["invoice_no"]]
+        if prior and not txs:
+            # Nothing new for this invoice: keep what the sheet already says
+            results[inv["invoice_no"]] = {"row": inv["row"], **prior}
+            continue
+        got = round(received[inv["invoice_no"]], 2)
+        if not txs:
+            status = STATUS_UNMATCHED
+        elif got >= inv["total"] - amount_tolerance:
+            status = STATUS_MATCHED
+        else:
+            status = STATUS_PARTIAL
+        dates = [t["date"] for t in txs]
+        if prior and parse_date(prior["payment_date"]):
+            dates.append(parse_date(prior["payment_date"]))
+        results[inv["invoice_no"]] = {
+            "row": inv["row"],
+            "status": status,
+            "received": got,
+            "payment_date": max(dates).strftime("%Y-%m-%d") if dates else "",
+            "refs": ", ".join(_prior_refs(inv) + [t["ref"] or t["source"] for t in txs]),
+        }
+    return results, unmatched
+
+
+def writeback_values(header, invoices, results):
+    """Build (first_column, rows) for writing RESULT_HEADERS beside the invoices.
+
+    Existing result columns are reused; otherwise they are appended after the
+    last header. Rows cover the header row through the last invoice row.
+    """
+    if RESULT_HEADERS[0] in header:
+        first_col = header.index(RESULT_HEADERS[0]) + 1
+    else:
+        first_col = len(header) + 1
+    last_row = max((inv["row"] for inv in invoices), default=1)
+    rows = [list(RESULT_HEADERS)] + [[""] * len(RESULT_HEADERS) for _ in range(last_row - 1)]
+    for inv in invoices:
+        res = results[inv["invoice_no"]]
+        rows[inv["row"] - 1] = [res["status"], res["received"], res["payment_date"], res["refs"]]
+    return first_col, rows
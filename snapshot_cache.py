@@ -0,0 +1,111 @@
+import threading
+import time
+
+# Stale-while-revalidate snapshot shared by every session.
+# Readers always get the last good snapshot immediately; once it is older
+# than `ttl` (or invalidated) a single background thread reloads it. A failed
+# reload keeps the previous snapshot and is retried after `retry_after`; a
+# failed first load is shared by every caller for that long instead of each
+# one repeating it.
+
+RETRY_AFTER = 30
+
+
+class IncompleteSnapshot(Exception):
+    # Raised by a loader that could only read part of its data. The partial
+    # value is served, but reloaded after retry_after instead of ttl.
+    def __init__(self, value, reason):
+        super().__init__(reason)
+        self.value = value
+
+
+class SnapshotCache:
+    def __init__(self, loader, ttl, retry_after=RETRY_AFTER):
+        # loader(previous) -> new snapshot; previous is None on the first load
+        self.loader = loader
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.value = None
+        self.loaded_at = 0.0
+        self.last_error = None
+        self.refreshing = False
+        # When the current snapshot (or the last failure) should be retried
+        self._stale_at = 0.0
+        # Bumped by invalidate(); a load only clears the invalidations it saw
+        self._invalidations = 0
+        self._loaded_invalidations = 0
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            value = self.value
+            if value is not None:
+                if self._needs_refresh() and not self.refreshing:
+                    self._start_refresh()
+                return value
+            if self._backing_off():
+                return None
+
+        # Nothing to serve yet: load in the foreground, one caller at a time.
+        # Sessions arriving meanwhile wait here and reuse that result, even
+        # when it failed.
+        with self._first_load:
+            with self._lock:
+                load = self.value is None and not self._backing_off()
+            if load:
+                self._load()
+            return self.value
+
+    def invalidate(self):
+        # Serve the current snapshot but refresh it in the background now
+        with self._lock:
+            self._invalidations += 1
+            if self.value is not None and not self.refreshing:
+                self._start_refresh()
+
+    def age(self):
+        return time.monotonic() - self.loaded_at if self.value is not None else None
+
+    def _backing_off(self):
+        # Caller holds self._lock
+        return self.last_error is not None and time.monotonic() < self._stale_at
+
+    def _needs_refresh(self):
+        return self._invalidations != self._loaded_invalidations or time.monotonic() >= self._stale_at
+
+    def _start_refresh(self):
+        # Caller holds self._lock
+        self.refreshing = True
+        threading.Thread(target=self._background_refresh, name="snapshot-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._load()
+        finally:
+            with self._lock:
+                self.refreshing = False
+
+    def _load(self):
+        with self._lock:
+            previous = self.value
+            invalidations = self._invalidations
+        error = None
+        try:
+            value = self.loader(previous)
+        except IncompleteSnapshot as e:
+            print(f"Snapshot loaded incompletely, retrying in {self.retry_after}s: {e}")
+            value, error = e.value, e
+        except Exception as e:
+            print(f"Snapshot refresh failed, keeping previous data: {e}")
+            with self._lock:
+                self.last_error = e
+                self._stale_at = time.monotonic() + self.retry_after
+                self._loaded_invalidations = invalidations
+            return
+        with self._lock:
+            self.value = value
+            self.loaded_at = time.monotonic()
+            self.last_error = error
+            self._stale_at = self.loaded_at + (self.retry_after if error is not None else self.ttl)
+            self._loaded_invalidations = invalidations